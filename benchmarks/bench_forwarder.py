@@ -0,0 +1,182 @@
+"""
+Forwarder throughput, latency and memory against fake Telegram and Redis.
+
+Each scenario creates tasks, injects new messages through
+`forwarder._on_new_message`, then edits and deletes a share of them via
+`_on_message_edit` / `_on_message_delete`. Latency is measured from
+injection until the last target has received the copy. Every scenario
+runs in a fresh interpreter so memory (peak RSS growth during the run)
+and module state do not leak between scenarios.
+
+Results are compared with benchmarks/baselines.json (per machine, not
+committed): a drop in throughput or a rise in p99/memory beyond the
+tolerance is reported and the script exits with status 1.
+
+    python -m benchmarks.bench_forwarder                 # run and compare
+    python -m benchmarks.bench_forwarder --save          # record new baselines
+    python -m benchmarks.bench_forwarder fanout flood    # selected scenarios
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASELINE_FILE = Path(__file__).with_name("baselines.json")
+TOLERANCE = 0.20
+
+# name: tasks, sources, targets per task, messages, latency/flood settings of the fake clients
+SCENARIOS = {
+    "single": dict(tasks=1, sources=1, targets=1, messages=1000),
+    "fanout": dict(tasks=20, sources=20, targets=10, messages=2000),
+    "many_tasks": dict(tasks=1000, sources=500, targets=2, messages=2000),
+    "shared_sources": dict(tasks=200, sources=10, targets=2, messages=1000, fan_in=3),
+    "latency": dict(tasks=20, sources=20, targets=5, messages=2000, latency=0.05, jitter=0.02),
+    "flood": dict(tasks=20, sources=20, targets=5, messages=1000, latency=0.01, flood_rate=0.01, bots=2),
+}
+EDIT_SHARE = 0.2
+DELETE_SHARE = 0.2
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def _run(spec: dict) -> dict:
+    from benchmarks import harness
+    from bot.plugins import forwarder
+
+    recorder = harness.Recorder()
+    client_options = {k: spec[k] for k in ("latency", "jitter", "flood_rate") if k in spec}
+    redis = harness.install(recorder, bots=spec.get("bots", 1), **client_options)
+    await harness.create_tasks(spec["tasks"], spec["sources"], spec["targets"], spec.get("fan_in", 1))
+    background = set(asyncio.all_tasks())
+    sources = [harness.channel_id(i) for i in range(spec["sources"])]
+    messages = spec["messages"]
+    injected = [(sources[i % len(sources)], i + 1) for i in range(messages)]
+    result = {}
+
+    started = time.perf_counter()
+    for chat, msg_id in injected:
+        recorder.start("new", chat, msg_id)
+        await forwarder._on_new_message(harness.make_event(chat, msg_id), chat)
+    await harness.drain(background)
+    result["new"] = (messages, time.perf_counter() - started, recorder.latencies("new"))
+
+    edited = injected[:int(messages * EDIT_SHARE)]
+    started = time.perf_counter()
+    for chat, msg_id in edited:
+        recorder.start("edit", chat, msg_id)
+        await forwarder._on_message_edit(harness.make_event(chat, msg_id, "edited"), chat)
+    await harness.drain(background)
+    result["edit"] = (len(edited), time.perf_counter() - started, recorder.latencies("edit"))
+
+    deleted = injected[-int(messages * DELETE_SHARE):]
+    started = time.perf_counter()
+    for chat, msg_id in deleted:
+        recorder.start("delete", chat, msg_id)
+        await forwarder._on_message_delete(chat, [msg_id])
+    await harness.drain(background)
+    result["delete"] = (len(deleted), time.perf_counter() - started, recorder.latencies("delete"))
+
+    result["redis_commands"] = redis.commands
+    return result
+
+
+def _run_here(name: str) -> dict:
+    """Run one scenario in this process (imports the bot) and return its report."""
+    from benchmarks import harness  # noqa: F401  (sets up the environment)
+    from bot import loop
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    raw = loop.run_until_complete(_run(SCENARIOS[name]))
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    report = {"peak_mb": round((rss_peak - rss_before) / 1024, 2), "redis_commands": raw["redis_commands"]}
+    for phase in ("new", "edit", "delete"):
+        count, elapsed, latencies = raw[phase]
+        report[phase] = {
+            "ops_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "delivered": len(latencies),
+            "count": count,
+        }
+    return report
+
+
+def run_scenario(name: str) -> dict:
+    """Run one scenario in a child interpreter."""
+    child = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_forwarder", "--child", name],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def _print(name: str, report: dict) -> None:
+    print(f"\n{name}  (peak {report['peak_mb']} MB, {report['redis_commands']} redis commands)")
+    for phase in ("new", "edit", "delete"):
+        r = report[phase]
+        print(
+            f"  {phase:<7} {r['ops_per_sec']:>10,.0f} msg/s   p50 {r['p50_ms']:>8.2f} ms"
+            f"   p99 {r['p99_ms']:>8.2f} ms   delivered {r['delivered']}/{r['count']}"
+        )
+
+
+def _regressions(name: str, report: dict, baseline: dict) -> list[str]:
+    problems = []
+    for phase in ("new", "edit", "delete"):
+        now, then = report[phase], baseline.get(phase)
+        if not then:
+            continue
+        if now["ops_per_sec"] < then["ops_per_sec"] * (1 - TOLERANCE):
+            problems.append(f"{name}/{phase}: {now['ops_per_sec']:,.0f} msg/s vs {then['ops_per_sec']:,.0f}")
+        # Sub-millisecond p99s are noise; only compare meaningful values
+        if then["p99_ms"] >= 1 and now["p99_ms"] > then["p99_ms"] * (1 + TOLERANCE):
+            problems.append(f"{name}/{phase}: p99 {now['p99_ms']} ms vs {then['p99_ms']} ms")
+    if "peak_mb" in baseline and report["peak_mb"] > baseline["peak_mb"] * (1 + TOLERANCE) + 1:
+        problems.append(f"{name}: peak {report['peak_mb']} MB vs {baseline['peak_mb']} MB")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(_run_here(args.scenarios[0])))
+        return
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    baselines = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    problems = []
+    for name in args.scenarios or SCENARIOS:
+        report = run_scenario(name)
+        _print(name, report)
+        if args.save:
+            baselines[name] = report
+        elif name in baselines:
+            problems += _regressions(name, report, baselines[name])
+
+    if args.save:
+        BASELINE_FILE.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"\nBaselines written to {BASELINE_FILE}")
+    elif problems:
+        print("\nRegressions:")
+        for problem in problems:
+            print(f"  • {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
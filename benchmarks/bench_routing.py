@@ -0,0 +1,90 @@
+"""
+Per-update handler cost for chats that have no forwarding task.
+
+Compares the raw fast path (`_route_update`) with building a full
+NewMessage event first, which is what the old handlers did before they
+could even look at SOURCE_INDEX.
+
+Runs fully offline; the clients are created but never connected.
+
+    python -m benchmarks.bench_routing [updates]
+"""
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+for _key, _value in {
+    "API_ID": "1",
+    "API_HASH": "0" * 32,
+    "BOT_TOKEN": "0:bench",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "ADMINS": "1",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from telethon import events  # noqa: E402
+from telethon.tl import types  # noqa: E402
+
+from bot import CACHE_READY, SOURCE_INDEX, loop  # noqa: E402
+from bot.plugins import forwarder  # noqa: E402
+
+
+def _make_updates(count: int, channels: int = 500) -> list:
+    now = datetime.now(timezone.utc)
+    updates = []
+    for i in range(count):
+        update = types.UpdateNewChannelMessage(
+            message=types.Message(
+                id=i + 1,
+                peer_id=types.PeerChannel(1_000_000 + i % channels),
+                date=now,
+                message="hello world",
+            ),
+            pts=i + 1,
+            pts_count=1,
+        )
+        update._entities = {}
+        updates.append(update)
+    return updates
+
+
+async def _fast_path(updates: list) -> None:
+    client = forwarder.bot
+    for update in updates:
+        await forwarder._route_update("bot", client, update, incoming_only=False)
+
+
+async def _event_path(updates: list) -> None:
+    client = forwarder.bot
+    for update in updates:
+        e = forwarder._build_event(client, update, events.NewMessage)
+        if e.chat_id in SOURCE_INDEX:
+            pass
+
+
+def _measure(label: str, coro_fn, updates: list) -> float:
+    start = time.perf_counter()
+    loop.run_until_complete(coro_fn(updates))
+    elapsed = time.perf_counter() - start
+    per_update = elapsed / len(updates) * 1e6
+    print(f"{label:<28} {per_update:8.2f} µs/update  ({len(updates) / elapsed:,.0f} updates/s)")
+    return per_update
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    # A realistic index: a few hundred sources, none of which match the traffic
+    for i in range(300):
+        SOURCE_INDEX[-1009000000000 - i] = {f"task{i}"}
+    updates = _make_updates(count)
+    CACHE_READY.set()
+
+    print(f"Irrelevant-chat handler cost over {count:,} updates")
+    fast = _measure("raw fast path", _fast_path, updates)
+    slow = _measure("event build + index check", _event_path, updates)
+    print(f"speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Offline stand-ins for Telegram and Redis so the forwarder can be driven in-process.
+
+Import this module before anything from `bot`: it fills in dummy credentials
+so the package imports without a real environment. The clients created by
+`bot` are never connected; `install()` swaps the sending pool and the Redis
+handle used by the database helpers for the fakes below.
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+for _key, _value in {
+    "API_ID": "1",
+    "API_HASH": "0" * 32,
+    "BOT_TOKEN": "0:bench",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "ADMINS": "1",
+    # Measure the forwarder, not the per-account send budget
+    "BOT_SEND_RATE": "1000000",
+    "USER_SEND_RATE": "1000000",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+from telethon.errors import FloodWaitError  # noqa: E402
+from telethon.tl import types  # noqa: E402
+
+from bot import CACHE, CACHE_READY, SOURCE_INDEX  # noqa: E402
+from bot.plugins import forwarder  # noqa: E402
+from bot.plugins.database import addwork_db, crossid_db, stats_db  # noqa: E402
+from bot.plugins.utils.health import HealthBoard  # noqa: E402
+from bot.plugins.utils.pool import POOL  # noqa: E402
+from bot.plugins.utils.routing import invalidate_routes  # noqa: E402
+
+_CHANNEL_OFFSET = 1000000000000
+# Benchmark messages end with "<chat>:<msg>" so copies (new messages) can be traced to their source
+_ORIGIN_RE = re.compile(r"(-\d+):(\d+)\s*$")
+
+
+def channel_id(index: int) -> int:
+    """Marked (-100...) chat ID for the index-th fake channel."""
+    return -_CHANNEL_OFFSET - (1_000_000 + index)
+
+
+# ──────────────────────────────────────────────
+#  Fake Redis
+# ──────────────────────────────────────────────
+
+class _Pipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> list:
+        results = [await method(*args, **kwargs) for method, args, kwargs in self._calls]
+        self._calls.clear()
+        return results
+
+
+class FakeRedis:
+    """Dict-backed subset of redis.asyncio.Redis (decode_responses=True) used by the bot."""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+        self.commands = 0
+
+    def pipeline(self, transaction: bool = True) -> _Pipeline:
+        return _Pipeline(self)
+
+    async def get(self, key):
+        self.commands += 1
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.commands += 1
+        self.data[key] = str(value)
+        return True
+
+    async def mget(self, keys):
+        self.commands += 1
+        return [self.data.get(k) for k in keys]
+
+    async def delete(self, *keys):
+        self.commands += 1
+        return sum(1 for k in keys if self.data.pop(k, None) is not None)
+
+    async def rename(self, old, new):
+        self.commands += 1
+        self.data[new] = self.data.pop(old)
+        return True
+
+    async def exists(self, *keys):
+        self.commands += 1
+        return sum(1 for k in keys if k in self.data)
+
+    async def expire(self, key, seconds):
+        self.commands += 1
+        return key in self.data
+
+    async def hincrby(self, key, field, amount=1):
+        self.commands += 1
+        bucket = self.data.setdefault(key, {})
+        bucket[field] = str(int(bucket.get(field, 0)) + amount)
+        return int(bucket[field])
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        self.commands += 1
+        bucket = self.data.setdefault(key, {})
+        if field is not None:
+            bucket[field] = str(value)
+        for f, v in (mapping or {}).items():
+            bucket[f] = str(v)
+        return True
+
+    async def hget(self, key, field):
+        self.commands += 1
+        return self.data.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        self.commands += 1
+        return dict(self.data.get(key, {}))
+
+    async def hmget(self, key, fields):
+        self.commands += 1
+        bucket = self.data.get(key, {})
+        return [bucket.get(f) for f in fields]
+
+    async def hdel(self, key, *fields):
+        self.commands += 1
+        bucket = self.data.get(key, {})
+        return sum(1 for f in fields if bucket.pop(f, None) is not None)
+
+
+# ──────────────────────────────────────────────
+#  Fake Telegram client
+# ──────────────────────────────────────────────
+
+class Recorder:
+    """Completion timestamps of every fake delivery, keyed back to the source message."""
+
+    def __init__(self):
+        self.started: dict[tuple, float] = {}
+        self.done: dict[tuple, float] = {}
+        # (target chat, forwarded msg id) -> (source chat, source msg id)
+        self.origin: dict[tuple[int, int], tuple[int, int]] = {}
+
+    def start(self, kind: str, chat: int, msg_id: int) -> None:
+        # The first copy counts when both clients deliver the same update
+        self.started.setdefault((kind, chat, msg_id), time.perf_counter())
+
+    def finish(self, kind: str, chat: int, msg_id: int) -> None:
+        self.done[(kind, chat, msg_id)] = time.perf_counter()
+
+    def latencies(self, kind: str) -> list[float]:
+        """Seconds from injection to the last target finishing, per source message."""
+        return sorted(
+            self.done[key] - started
+            for key, started in self.started.items()
+            if key[0] == kind and key in self.done
+        )
+
+
+class FakeClient:
+    """
+    Stand-in for a TelegramClient covering the calls the forwarder makes.
+
+    Every request sleeps for `latency` seconds (± `jitter`), and fails with
+    a FloodWaitError of `flood_seconds` with probability `flood_rate`.
+    """
+
+    def __init__(self, recorder: Recorder, latency: float = 0.0, jitter: float = 0.0,
+                 flood_rate: float = 0.0, flood_seconds: int = 1):
+        self.recorder = recorder
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.requests = 0
+        self._next_id = 0
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def _request(self) -> None:
+        self.requests += 1
+        delay = self.latency + (random.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.flood_rate and random.random() < self.flood_rate:
+            raise FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def get_input_entity(self, peer):
+        if isinstance(peer, int) and peer < -_CHANNEL_OFFSET:
+            return types.InputPeerChannel(channel_id=-_CHANNEL_OFFSET - peer, access_hash=0)
+        raise ValueError(f"Could not find the input entity for {peer!r}")
+
+    async def __call__(self, request):
+        await self._request()
+        src = -_CHANNEL_OFFSET - request.from_peer.channel_id
+        dst = -_CHANNEL_OFFSET - request.to_peer.channel_id
+        updates = []
+        for msg_id in request.id:
+            self._next_id += 1
+            # A chained task forwards an earlier copy; credit the message it came from
+            origin = self.recorder.origin.get((src, msg_id), (src, msg_id))
+            self.recorder.origin[(dst, self._next_id)] = origin
+            self.recorder.finish("new", *origin)
+            updates.append(types.UpdateMessageID(id=self._next_id, random_id=0))
+        return types.Updates(updates=updates, users=[], chats=[], date=None, seq=0)
+
+    async def send_message(self, entity, message="", file=None, **kwargs):
+        """Copy mode: a new message; its source is taken from the text ("<chat>:<msg>" in benchmarks)."""
+        await self._request()
+        self._next_id += 1
+        match = _ORIGIN_RE.search(message or "")
+        if match:
+            dst = -_CHANNEL_OFFSET - entity.channel_id
+            origin = (int(match.group(1)), int(match.group(2)))
+            self.recorder.origin[(dst, self._next_id)] = origin
+            self.recorder.finish("new", *origin)
+        return types.Message(id=self._next_id, peer_id=entity, date=None, message=message)
+
+    async def edit_message(self, chat, msg_id, text=None, **kwargs):
+        await self._request()
+        origin = self.recorder.origin.get((chat, msg_id))
+        if origin:
+            self.recorder.finish("edit", *origin)
+
+    async def delete_messages(self, chat, msg_ids):
+        await self._request()
+        for msg_id in msg_ids:
+            origin = self.recorder.origin.pop((chat, msg_id), None)
+            if origin:
+                self.recorder.finish("delete", *origin)
+
+
+# ──────────────────────────────────────────────
+#  Events and setup
+# ──────────────────────────────────────────────
+
+class MessageEvent:
+    """The parts of a NewMessage/MessageEdited event the forwarder reads."""
+
+    __slots__ = ("id", "message")
+
+    def __init__(self, message: types.Message):
+        self.id = message.id
+        self.message = message
+
+
+def make_event(chat_id: int, msg_id: int, text: str | None = None, reply_to: int | None = None) -> MessageEvent:
+    message = types.Message(
+        id=msg_id,
+        peer_id=types.PeerChannel(-_CHANNEL_OFFSET - chat_id),
+        date=datetime.now(timezone.utc),
+        message=f"benchmark message {chat_id}:{msg_id}" if text is None else text,
+        reply_to=types.MessageReplyHeader(reply_to_msg_id=reply_to) if reply_to else None,
+    )
+    return MessageEvent(message)
+
+
+def install(recorder: Recorder, bots: int = 1, userbots: int = 0, **client_options) -> FakeRedis:
+    """
+    Reset forwarder state and route all sends and Redis calls to fakes.
+
+    Returns the FakeRedis now used by the database helpers.
+    """
+    redis = FakeRedis()
+    addwork_db.db = redis
+    stats_db.db = redis
+    stats_db._pending.clear()
+    crossid_db.db = redis
+    crossid_db.WINDOW.clear()
+
+    CACHE.clear()
+    SOURCE_INDEX.clear()
+    addwork_db.rebuild_name_index()
+    invalidate_routes()
+    forwarder.OWN_SENDS.clear()
+    forwarder.SEEN.clear()
+    forwarder._processed.clear()
+    forwarder._processed_edits.clear()
+    forwarder._processed_deletes.clear()
+    forwarder.HEALTH = HealthBoard()
+
+    for member in POOL.members():
+        POOL.remove(member.name)
+    POOL.clear()
+    for i in range(bots):
+        POOL.add("bot" if i == 0 else f"bot{i + 1}", FakeClient(recorder, **client_options), "bot")
+    for i in range(userbots):
+        POOL.add("userbot" if i == 0 else f"userbot{i + 1}", FakeClient(recorder, **client_options), "userbot")
+
+    CACHE_READY.set()
+    return redis
+
+
+async def create_tasks(tasks: int, sources: int, targets: int, fan_in: int = 1) -> None:
+    """
+    Create `tasks` forwarding tasks over `sources` source channels.
+
+    Task i reads `fan_in` consecutive sources (wrapping) and writes to
+    `targets` channels of its own, so fan-out is `targets` per task.
+    """
+    for i in range(tasks):
+        source = [channel_id((i + k) % sources) for k in range(fan_in)]
+        target = [channel_id(100_000 + i * targets + k) for k in range(targets)]
+        await addwork_db.setup_work(f"bench{i}", source, target)
+        await addwork_db.edit_work(f"bench{i}", has_to_edit=True)
+
+
+async def drain(background: set) -> None:
+    """Wait until every task spawned since `background` was captured has finished."""
+    current = asyncio.current_task()
+    while True:
+        pending = [t for t in asyncio.all_tasks() if t is not current and t not in background]
+        if not pending:
+            return
+        await asyncio.wait(pending)
@@ -0,0 +1,139 @@
+"""
+Replay a recorded update stream through the forwarder against fake clients.
+
+Record on a live deployment by setting RECORD_UPDATES=/path/updates.jsonl
+(content is anonymized, see bot/plugins/utils/recorder.py), then:
+
+    python -m benchmarks.replay updates.jsonl               # real time
+    python -m benchmarks.replay updates.jsonl --speed 10    # 10x faster
+    python -m benchmarks.replay updates.jsonl --speed max   # as fast as possible
+
+Tasks are recreated from the recording's header, every update is rebuilt
+as a raw Telegram update and fed to `forwarder._route_update` for the
+client that received it, so listener selection, filtering, dedup and
+sending all run as in production. Sends go to harness.FakeClient with the
+given latency.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from benchmarks import harness
+
+from telethon.tl import types
+
+from bot import loop
+from bot.plugins import forwarder
+from bot.plugins.database import addwork_db
+from bot.plugins.utils.listeners import ListenerTable
+from bot.plugins.utils.recorder import read_recording
+
+
+def _channel(index: int) -> int:
+    """Bare channel ID (as in PeerChannel) of the index-th fake channel."""
+    return -1000000000000 - harness.channel_id(index)
+
+
+def _build_update(entry: list):
+    _, _, kind, chat, msg_ids, grouped_id, text_len, media, out = entry
+    if kind == "delete":
+        return types.UpdateDeleteChannelMessages(
+            channel_id=_channel(chat), messages=msg_ids, pts=0, pts_count=len(msg_ids),
+        )
+    message = types.Message(
+        id=msg_ids[0],
+        peer_id=types.PeerChannel(_channel(chat)),
+        date=datetime.now(timezone.utc),
+        message="x" * text_len,
+        out=out,
+        grouped_id=grouped_id,
+        media=types.MessageMediaUnsupported() if media else None,
+    )
+    if kind == "edit":
+        update = types.UpdateEditChannelMessage(message=message, pts=0, pts_count=1)
+    else:
+        update = types.UpdateNewChannelMessage(message=message, pts=0, pts_count=1)
+    update._entities = {}
+    return update
+
+
+async def _setup(header: dict, recorder: harness.Recorder, latency: float, clients: set) -> None:
+    harness.install(recorder, bots=1, userbots=1 if "userbot" in clients else 0, latency=latency)
+    # Listen with the fakes so replayed updates pass the single-listener check
+    forwarder.LISTENERS = ListenerTable()
+    for name in clients:
+        forwarder.LISTENERS.register(name, harness.FakeClient(recorder))
+    for i, task in enumerate(header["tasks"]):
+        name = f"replay{i}"
+        await addwork_db.setup_work(
+            name,
+            [harness.channel_id(c) for c in task["source"]],
+            [harness.channel_id(c) for c in task["target"]],
+        )
+        await addwork_db.edit_work(
+            name,
+            delay=task.get("delay", 0),
+            has_to_forward=task.get("has_to_forward", True),
+            has_to_edit=task.get("has_to_edit", False),
+        )
+
+
+async def replay(path: str, speed: float | None, latency: float) -> None:
+    header, entries = read_recording(path)
+    recorder = harness.Recorder()
+    clients = {entry[1] for entry in entries} | {"bot"}
+    await _setup(header, recorder, latency, clients)
+    background = set(asyncio.all_tasks())
+    updates = [(entry, _build_update(entry)) for entry in entries]
+    tracked = {harness.channel_id(c) for task in header["tasks"] for c in task["source"]}
+
+    lag = []
+    started = time.perf_counter()
+    for entry, update in updates:
+        if speed:
+            due = entry[0] / 1000 / speed
+            behind = time.perf_counter() - started - due
+            if behind < 0:
+                await asyncio.sleep(-behind)
+            else:
+                lag.append(behind)
+        chat = harness.channel_id(entry[3])
+        if chat in tracked:
+            for msg_id in entry[4]:
+                recorder.start(entry[2], chat, msg_id)
+        name = entry[1]
+        # Events are built with the real (unconnected) bot client, sends go to the fakes
+        asyncio.ensure_future(forwarder._route_update(
+            name, forwarder.bot, update, incoming_only=name.startswith("bot"),
+        ))
+    fed = time.perf_counter() - started
+    await harness.drain(background)
+    elapsed = time.perf_counter() - started
+
+    span = entries[-1][0] / 1000 if entries else 0
+    print(f"Replayed {len(entries):,} updates spanning {span:,.1f}s of traffic ({len(header['tasks'])} tasks)")
+    print(f"  fed in {fed:,.2f}s, drained after {elapsed:,.2f}s ({len(entries) / elapsed:,.0f} updates/s)")
+    if lag:
+        lag.sort()
+        print(f"  schedule lag: p50 {lag[len(lag) // 2] * 1000:.1f} ms, max {lag[-1] * 1000:.1f} ms")
+    for kind in ("new", "edit", "delete"):
+        latencies = recorder.latencies(kind)
+        if latencies:
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"  {kind:<7} delivered {len(latencies):>7,}   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="file written with RECORD_UPDATES")
+    parser.add_argument("--speed", default="1", help="replay speed multiplier, or 'max' (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake send latency in seconds (default: 0.05)")
+    args = parser.parse_args()
+    speed = None if args.speed == "max" else float(args.speed)
+    loop.run_until_complete(replay(args.recording, speed, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 import asyncio
 import logging
+import time
 
 from redis.asyncio import Redis
 from telethon import TelegramClient
-from telethon.sessions import StringSession
 
 from .config import Var
+from .sessions import RedisSession
 
 logging.basicConfig(
     format="%(asctime)s || %(name)s [%(levelname)s] : %(message)s",
@@ -22,10 +23,42 @@ asyncio.set_event_loop(loop)
 # Redis key for storing the forwarding mode ("bot" or "userbot")
 FORWARD_MODE_KEY = "__FORWARD_MODE__"
 
+# --- Redis ---
+try:
+    db = Redis.from_url(Var.REDIS_URL, decode_responses=True)
+    CACHE: dict[str, dict] = {}
+    SOURCE_INDEX: dict[int, set[str]] = {}
+    # Set once CACHE/SOURCE_INDEX are loaded; forwarding handlers wait on it
+    CACHE_READY = asyncio.Event()
+except Exception as e:
+    LOGS.critical("Failed to connect to Redis: %s", e)
+    exit(1)
+
+# --- Telethon sessions ---
+# Kept in Redis so auth, entity cache and update state (pts) survive restarts;
+# loaded before the clients are created since the auth key is read on creation.
+bot_session = RedisSession(db, "bot", seed=Var.BOT_TOKEN)
+userbot_session = (
+    RedisSession(db, "userbot", seed=Var.SESSION_STRING, string=Var.SESSION_STRING)
+    if Var.SESSION_STRING else None
+)
+extra_sessions = [
+    (f"bot{i}", RedisSession(db, f"bot{i}", seed=token), token)
+    for i, token in enumerate(Var.EXTRA_BOT_TOKENS, start=2)
+] + [
+    (f"userbot{i}", RedisSession(db, f"userbot{i}", seed=string, string=string), None)
+    for i, string in enumerate(Var.EXTRA_SESSION_STRINGS, start=2)
+]
+SESSIONS = [bot_session, userbot_session] + [sess for _, sess, _ in extra_sessions]
+SESSIONS = [sess for sess in SESSIONS if sess]
+_started = time.perf_counter()
+loop.run_until_complete(asyncio.gather(*(sess.load() for sess in SESSIONS)))
+SESSION_LOAD_SECONDS = time.perf_counter() - _started
+
 # --- Bot client (always created) ---
 try:
     LOGS.info("Creating bot client...")
-    bot = TelegramClient(None, Var.API_ID, Var.API_HASH, loop=loop)
+    bot = TelegramClient(bot_session, Var.API_ID, Var.API_HASH, loop=loop, catch_up=True)
     LOGS.info("Bot client created.")
 except Exception as e:
     LOGS.critical("Failed to create bot client: %s", e)
@@ -33,11 +66,11 @@ except Exception as e:
 
 # --- Userbot client (only if SESSION_STRING is provided) ---
 userbot: TelegramClient | None = None
-if Var.SESSION_STRING:
+if userbot_session:
     try:
         LOGS.info("Creating userbot client...")
         userbot = TelegramClient(
-            StringSession(Var.SESSION_STRING), Var.API_ID, Var.API_HASH, loop=loop
+            userbot_session, Var.API_ID, Var.API_HASH, loop=loop, catch_up=True
         )
         LOGS.info("Userbot client created.")
     except Exception as e:
@@ -46,14 +79,14 @@ if Var.SESSION_STRING:
 else:
     LOGS.info("SESSION_STRING not provided. Userbot disabled.")
 
-# --- Redis ---
-try:
-    db = Redis.from_url(Var.REDIS_URL, decode_responses=True)
-    CACHE: dict[str, dict] = {}
-    SOURCE_INDEX: dict[int, set[str]] = {}
-except Exception as e:
-    LOGS.critical("Failed to connect to Redis: %s", e)
-    exit(1)
+# --- Extra pool clients (send-only, started in __main__) ---
+# Each entry is (name, client, bot_token or None for user sessions)
+EXTRA_CLIENTS: list[tuple[str, TelegramClient, str | None]] = []
+for name, session, token in extra_sessions:
+    try:
+        EXTRA_CLIENTS.append((name, TelegramClient(session, Var.API_ID, Var.API_HASH, loop=loop), token))
+    except Exception as e:
+        LOGS.error("Failed to create pool client %s: %s", name, e)
 
 
 async def get_forward_mode() -> str:
@@ -1,22 +1,38 @@
+import asyncio
 import json
+import time
 from glob import glob
 from importlib import import_module
 from traceback import format_exc
 
 import bot as _bot_pkg
-from . import CACHE, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, Var, bot, db, loop, userbot
+from . import (
+    CACHE, CACHE_READY, EXTRA_CLIENTS, FORWARD_MODE_KEY, LOGS, SESSION_LOAD_SECONDS, SESSIONS,
+    SOURCE_INDEX, Var, bot, db, get_forward_mode, loop, userbot,
+)
 from redis.asyncio import Redis
 
+from .plugins.database.addwork_db import migrate_crossids, rebuild_name_index
+from .plugins.database.entity_db import warmup_entities, warmup_from_dialogs
+from .plugins.utils.metrics import serve_metrics
+from .plugins.utils.pool import POOL
+from .plugins.utils.routing import find_cycle
+from .plugins.utils.watchdog import WATCHDOG
+from .sessions import autosave_sessions
+from .startup import StartupTimer
+
 
 async def sync_redis_to_cache(redis_db: Redis, cache: dict) -> None:
     """Load all task data from Redis into local CACHE on startup."""
     try:
-        keys = await redis_db.keys()
-        for key in keys:
-            if key == FORWARD_MODE_KEY:
-                continue
-            raw = await redis_db.get(key)
-            if raw:
+        # System keys (forward mode, entity caches, ...) are prefixed with "__"
+        keys = [key for key in await redis_db.keys() if not key.startswith("__")]
+        # Fetch task blobs in batches instead of one GET round trip per task
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            for key, raw in zip(batch, await redis_db.mget(batch)):
+                if not raw:
+                    continue
                 task_data = json.loads(raw)
                 cache[key] = task_data
                 # Build SOURCE_INDEX for O(1) lookups
@@ -26,13 +42,53 @@ async def sync_redis_to_cache(redis_db: Redis, cache: dict) -> None:
         LOGS.exception("Failed to sync Redis to local cache: %s", e)
 
 
+def cache_tasks() -> list[dict]:
+    """Return all task dicts in CACHE (skipping system values like the forward mode)."""
+    return [task for task in CACHE.values() if isinstance(task, dict)]
+
+
+async def warmup_task_entities() -> None:
+    """
+    Populate access hashes for the chats used by tasks on every user account.
+
+    StringSession only stores the auth key, NOT the entity cache, and
+    without the hashes Telethon can't receive updates from channels.
+    Only task chats are resolved (batched GetChannels + persisted hashes);
+    dialogs are scanned only for chats that still could not be resolved.
+    """
+    peer_ids = set(SOURCE_INDEX)
+    for task in cache_tasks():
+        peer_ids.update(task.get("target") or [])
+    if not peer_ids:
+        return
+
+    accounts = [_bot_pkg.userbot] if _bot_pkg.userbot else []
+    accounts += [client for _, client, token in EXTRA_CLIENTS if token is None]
+
+    async def warm(client):
+        started = time.perf_counter()
+        missing = await warmup_entities(client, peer_ids)
+        if missing:
+            missing = await warmup_from_dialogs(client, missing)
+        LOGS.info(
+            "Entity warmup for account %s: %d chats in %.2fs (%d unresolved)",
+            client._self_id, len(peer_ids), time.perf_counter() - started, len(missing),
+        )
+
+    results = await asyncio.gather(*(warm(c) for c in accounts), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            LOGS.warning("Entity warmup failed: %s", result)
+
+
 async def load_forward_mode(redis_db: Redis, cache: dict) -> None:
     """Load the forwarding mode from Redis into CACHE."""
     mode = await redis_db.get(FORWARD_MODE_KEY)
     if mode not in ("bot", "userbot"):
         mode = "bot"
     # Auto-correct: if mode is userbot but client is unavailable
-    if mode == "userbot" and not _bot_pkg.userbot:
+    has_userbot = _bot_pkg.userbot or any(token is None for _, _, token in EXTRA_CLIENTS)
+    if mode == "userbot" and not has_userbot:
         LOGS.warning("Forward mode is 'userbot' but userbot unavailable. Falling back to 'bot'.")
         mode = "bot"
         await redis_db.set(FORWARD_MODE_KEY, mode)
@@ -40,51 +96,116 @@ async def load_forward_mode(redis_db: Redis, cache: dict) -> None:
     LOGS.info("Forwarding mode: %s", mode)
 
 
-# --- Start the bot client ---
-try:
-    bot.start(bot_token=Var.BOT_TOKEN)
-except Exception as e:
-    LOGS.critical("Failed to start bot: %s", e)
-    exit(1)
+def load_plugins() -> None:
+    """Dynamically load all plugin modules so their handlers are registered."""
+    plugins = sorted(glob("bot/plugins/*.py"))
+    for plugin in plugins:
+        if plugin.endswith("_.py"):
+            continue
+        module_path = plugin.replace(".py", "").replace("/", ".").replace("\\", ".")
+        try:
+            import_module(module_path)
+            LOGS.info("Loaded plugin: %s", module_path)
+        except Exception:
+            LOGS.error("Failed to load plugin: %s\n%s", module_path, format_exc())
+
 
-# --- Start the userbot client (if available) ---
-if userbot:
+async def start_client(name: str, client, bot_token: str | None = None) -> bool:
+    """Connect and authorize one client. Returns False if it failed to start."""
     try:
-        userbot.start()
-        LOGS.info("Userbot client started.")
-        # Fetch dialogs to populate the entity cache (access hashes).
-        # StringSession only stores the auth key, NOT the entity cache.
-        # Without this, Telethon can't receive updates from channels.
-        LOGS.info("Fetching userbot dialogs to cache channel access hashes...")
-        loop.run_until_complete(userbot.get_dialogs())
-        LOGS.info("Userbot dialogs fetched.")
+        if bot_token:
+            await client.start(bot_token=bot_token)
+        else:
+            await client.start()
+        LOGS.info("%s client started.", name)
+        return True
     except Exception as e:
-        LOGS.error("Failed to start userbot: %s (falling back to bot)", e)
-        _bot_pkg.userbot = None
+        LOGS.error("Failed to start %s client: %s", name, e)
+        return False
 
-# Dynamically load all plugin modules
-plugins = sorted(glob("bot/plugins/*.py"))
-for plugin in plugins:
-    if plugin.endswith("_.py"):
-        continue
-    module_path = plugin.replace(".py", "").replace("/", ".").replace("\\", ".")
+
+async def load_cache() -> None:
+    """Load tasks and the forward mode, then release the held forwarding handlers."""
+    await sync_redis_to_cache(db, CACHE)
+    rebuild_name_index()
+    await migrate_crossids()
+    cycle = find_cycle()
+    if cycle:
+        # Stored before loops were rejected; changes to the tasks on it are refused until it is broken
+        LOGS.warning(
+            "Tasks form a forwarding loop %s; pause or edit one of them",
+            " → ".join(str(chat) for chat in cycle),
+        )
+    CACHE[FORWARD_MODE_KEY] = await get_forward_mode()
+    CACHE_READY.set()
+    LOGS.info("Successfully synced Redis into local cache.")
+
+
+async def start_metrics() -> None:
+    """Start the optional metrics endpoint; a failure only disables metrics."""
     try:
-        import_module(module_path)
-        LOGS.info("Loaded plugin: %s", module_path)
-    except Exception:
-        LOGS.error("Failed to load plugin: %s\n%s", module_path, format_exc())
+        await serve_metrics(Var.METRICS_HOST, Var.METRICS_PORT)
+    except Exception as e:
+        LOGS.error("Failed to start metrics endpoint: %s", e)
+
+
+async def startup() -> None:
+    """
+    Start everything with independent stages running concurrently.
 
-LOGS.info("Syncing Redis into local cache...")
-loop.run_until_complete(sync_redis_to_cache(db, CACHE))
-loop.run_until_complete(load_forward_mode(db, CACHE))
-LOGS.info("Successfully synced Redis into local cache.")
+    Handlers are registered before any client connects so caught-up updates
+    are not lost; they wait on CACHE_READY until the Redis sync finishes.
+    """
+    WATCHDOG.start()
+    timer = StartupTimer()
+    timer.record("session load", SESSION_LOAD_SECONDS)
+    timer.measure("plugins", load_plugins)
 
+    stages = [
+        timer.run("bot start", start_client("bot", bot, Var.BOT_TOKEN)),
+        timer.run("redis sync", load_cache()),
+    ]
+    if userbot:
+        stages.append(timer.run("userbot start", start_client("userbot", userbot)))
+    for name, client, token in EXTRA_CLIENTS:
+        stages.append(timer.run(f"{name} start", start_client(name, client, token)))
+    if Var.METRICS_PORT:
+        asyncio.ensure_future(timer.run("metrics server", start_metrics()))
+    results = await asyncio.gather(*stages)
+
+    if not results[0]:
+        LOGS.critical("Failed to start bot.")
+        exit(1)
+    if userbot and not results[2]:
+        LOGS.error("Userbot unavailable (falling back to bot).")
+        _bot_pkg.userbot = None
+        POOL.remove("userbot")
+    offset = 3 if userbot else 2
+    for (name, client, token), ok in zip(list(EXTRA_CLIENTS), results[offset:]):
+        if not ok:
+            LOGS.error("Pool client %s removed from pool.", name)
+            EXTRA_CLIENTS.remove((name, client, token))
+            POOL.remove(name)
+
+    # Needs the final userbot state to auto-correct the mode
+    await timer.run("forward mode", load_forward_mode(db, CACHE))
+    await timer.run("entity warmup", warmup_task_entities())
+    LOGS.info(timer.report())
+
+
+loop.run_until_complete(startup())
 LOGS.info("Bot started. Userbot active: %s", _bot_pkg.userbot is not None)
 
+# Snapshot update state and entities to Redis while running
+clients = [bot] + ([_bot_pkg.userbot] if _bot_pkg.userbot else []) + [c for _, c, _ in EXTRA_CLIENTS]
+asyncio.ensure_future(autosave_sessions(clients))
+
 try:
     # bot.run_until_disconnected() keeps the event loop alive for BOTH clients
     # (bot + userbot share the same loop, so userbot stays connected too)
     bot.run_until_disconnected()
 except KeyboardInterrupt:
     LOGS.info("Shutting down bot...")
-    exit(0)
+finally:
+    loop.run_until_complete(asyncio.gather(*(sess.flush() for sess in SESSIONS)))
+exit(0)
@@ -8,3 +8,27 @@ class Var:
     REDIS_URL: str = config("REDIS_URL")
     ADMINS: list[int] = [int(i) for i in config("ADMINS").split()]
     SESSION_STRING: str | None = config("SESSION_STRING", default=None)
+    # Additional accounts in the sending pool (space separated)
+    EXTRA_BOT_TOKENS: list[str] = config("EXTRA_BOT_TOKENS", default="").split()
+    EXTRA_SESSION_STRINGS: list[str] = config("EXTRA_SESSION_STRINGS", default="").split()
+    # Per-account send budget in messages per second (0 disables the limit)
+    BOT_SEND_RATE: float = config("BOT_SEND_RATE", default=20, cast=float)
+    USER_SEND_RATE: float = config("USER_SEND_RATE", default=5, cast=float)
+    # Prometheus-style /metrics endpoint; disabled when METRICS_PORT is 0
+    METRICS_HOST: str = config("METRICS_HOST", default="127.0.0.1")
+    METRICS_PORT: int = config("METRICS_PORT", default=0, cast=int)
+    # Fraction of new messages traced stage by stage (0 disables, 1 traces all)
+    TRACE_SAMPLE_RATE: float = config("TRACE_SAMPLE_RATE", default=0, cast=float)
+    TRACE_FILE: str = config("TRACE_FILE", default="traces.jsonl")
+    # Record the anonymized update stream to this file for offline replay
+    RECORD_UPDATES: str | None = config("RECORD_UPDATES", default=None)
+    # Loop stalls longer than this are logged with the blocking stack
+    LOOP_LAG_THRESHOLD_MS: int = config("LOOP_LAG_THRESHOLD_MS", default=200, cast=int)
+    # Recently forwarded messages whose copies are kept in memory (older ones are read from Redis)
+    CROSSID_WINDOW: int = config("CROSSID_WINDOW", default=20000, cast=int)
+    # Share of each account's send budget normal tasks leave for high priority ones (low leaves twice this)
+    PRIORITY_RESERVE: float = config("PRIORITY_RESERVE", default=0.2, cast=float)
+    # Tasks with content dedup skip posts already sent to a target this recently (seconds)
+    DEDUP_WINDOW: int = config("DEDUP_WINDOW", default=900, cast=int)
+    # Distinct posts per half window the dedup filter holds at its 0.1% false-positive rate
+    DEDUP_CAPACITY: int = config("DEDUP_CAPACITY", default=100000, cast=int)
@@ -4,6 +4,6 @@ import re
 from telethon import Button, events
 
 from bot import (
-    CACHE, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, Var,
+    CACHE, CACHE_READY, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, Var,
     bot, db, get_forward_mode, set_forward_mode, userbot,
 )
@@ -1,55 +1,88 @@
 import re as _re
+import time
 
-from . import CACHE, FORWARD_MODE_KEY, LOGS, Var, bot, events, userbot
+from telethon.utils import get_peer_id
+
+from . import CACHE, FORWARD_MODE_KEY, LOGS, Var, asyncio, bot, events
 from .database.addwork_db import is_work_present, setup_work
+from .database.channel_db import get_channel_meta, remember_channel_meta
+from .database.entity_db import fetch_entities, remember_entities
+from .utils.pool import POOL
+from .utils.routing import RoutingCycleError
 
 # Regex to detect Telegram invite links
 _INVITE_RE = _re.compile(r"(?:https?://)?t(?:elegram)?\.me/(?:\+|joinchat/)([a-zA-Z0-9_-]+)")
 
+# Validation: per-ID lookups and invite joins running at once
+_LOOKUP_CONCURRENCY = 8
+_JOIN_CONCURRENCY = 3
+# Inputs from which progress is reported, and how often it is updated
+_PROGRESS_MIN_INPUTS = 20
+_PROGRESS_INTERVAL = 2  # seconds
+
+
+def _userbot_client():
+    """Return the primary userbot client if it is in the pool (i.e. it started)."""
+    member = POOL.get("userbot")
+    return member.client if member else None
+
 
 def _get_active_client():
     """Return the forwarding client based on current mode."""
     mode = CACHE.get(FORWARD_MODE_KEY, "bot")
+    userbot = _userbot_client()
     if mode == "userbot" and userbot:
         return userbot
     return bot
 
 
+def _format_channel(chat_id: int, meta: dict | None) -> str:
+    if not meta:
+        return f"Unknown (ID: {chat_id})"
+    title = meta["title"]
+    name = f"{title} (@{meta['username']})" if meta.get("username") else f"{title} (ID: {chat_id})"
+    if meta.get("members"):
+        name += f" · {meta['members']:,} members"
+    return name
+
+
+async def resolve_channel_names(chat_ids: list[int]) -> list[str]:
+    """Display names for chat IDs, from the metadata cache; unknown chats are fetched concurrently."""
+    metas = await get_channel_meta(_get_active_client(), chat_ids)
+    return [_format_channel(cid, metas.get(cid)) for cid in chat_ids]
+
+
 async def resolve_channel_name(chat_id: int) -> str:
     """Resolve a chat ID to a display name with username or ID fallback."""
-    client = _get_active_client()
-    try:
-        entity = await client.get_entity(chat_id)
-        title = getattr(entity, "title", None) or getattr(entity, "first_name", str(chat_id))
-        username = getattr(entity, "username", None)
-        if username:
-            return f"{title} (@{username})"
-        return f"{title} (ID: {chat_id})"
-    except Exception:
-        return f"Unknown (ID: {chat_id})"
+    return (await resolve_channel_names([chat_id]))[0]
 
 
-async def _try_join_invite(conv, invite_hash: str) -> int | None:
-    """Try to join a channel via invite link using userbot. Returns chat_id or None."""
-    client = _get_active_client()
+async def cycle_message(exc: RoutingCycleError) -> str:
+    """Explain a rejected task change that would loop messages between chats."""
+    names = await resolve_channel_names(exc.cycle)
+    return (
+        "⚠️ **Forwarding Loop**\n\n"
+        "Messages would keep going round these chats:\n"
+        + "\n  ↓\n".join(f"  {name}" for name in names)
+    )
+
+
+async def _try_join_invite(client, invite_hash: str) -> tuple[int | None, str]:
+    """Try to join a channel via invite link. Returns (chat_id or None, message for the admin)."""
     try:
         from telethon.tl.functions.messages import ImportChatInviteRequest
-        await conv.send_message(
-            "🔗 Invite link detected. Attempting to join..."
-        )
         updates = await client(ImportChatInviteRequest(invite_hash))
         chat = updates.chats[0]
+        await remember_entities(client, [chat])
         title = getattr(chat, "title", "Unknown")
-        chat_id = -1000000000000 - chat.id if hasattr(chat, "id") else chat.id
         # Use the proper peer ID
         from telethon.utils import get_peer_id
         chat_id = get_peer_id(chat)
-        await conv.send_message(
+        return chat_id, (
             f"✅ Successfully joined channel!\n"
             f"**Name** : {title}\n"
             f"**ID** : {chat_id}"
         )
-        return chat_id
     except Exception as exc:
         exc_msg = str(exc).lower()
         # Already a member — resolve the channel from the invite link
@@ -58,98 +91,187 @@ async def _try_join_invite(conv, invite_hash: str) -> int | None:
                 from telethon.tl.functions.messages import CheckChatInviteRequest
                 invite_info = await client(CheckChatInviteRequest(invite_hash))
                 chat = invite_info.chat
+                await remember_entities(client, [chat])
                 from telethon.utils import get_peer_id
                 chat_id = get_peer_id(chat)
                 title = getattr(chat, "title", "Unknown")
-                await conv.send_message(
+                return chat_id, (
                     f"✅ Successfully Found Channel!\n"
                     f"**Name** : {title}\n"
                     f"**ID** : {chat_id}"
                 )
-                return chat_id
             except Exception as inner_exc:
                 LOGS.warning("Failed to resolve already-joined channel: %s", inner_exc)
-                await conv.send_message(
+                return None, (
                     "⚠️ Already a member but couldn't resolve channel info.\n"
                     "Please use the channel ID directly instead.\n\n"
                     "Try again:"
                 )
-                return None
         # Channel requires admin approval — join request was sent
         if "requested to join" in exc_msg:
             LOGS.info("Join request sent for invite hash: %s", invite_hash)
-            await conv.send_message(
+            return None, (
                 "⏳ **Join Request Sent**\n\n"
                 "This channel requires admin approval.\n"
                 "Once approved, add the channel using its ID.\n\n"
                 "Try again with a different link or channel ID:"
             )
-            return None
         LOGS.warning("Failed to join via invite: %s", exc)
-        await conv.send_message(
+        return None, (
             "⚠️ **Failed to join channel**\n\n"
             f"Error: {exc}\n\n"
             "Try again with a valid invite link or channel ID:"
         )
-        return None
+
+
+class _Progress:
+    """Progress message for long validations, edited at most every few seconds."""
+
+    __slots__ = ("conv", "total", "done", "_message", "_edited")
+
+    def __init__(self, conv, total: int):
+        self.conv = conv
+        self.total = total
+        self.done = 0
+        self._message = None
+        self._edited = 0.0
+
+    async def start(self) -> None:
+        if self.total >= _PROGRESS_MIN_INPUTS:
+            self._message = await self.conv.send_message(f"🔍 Validating {self.total} channels...")
+            self._edited = time.monotonic()
+
+    async def advance(self, count: int = 1) -> None:
+        self.done += count
+        if not self._message or time.monotonic() - self._edited < _PROGRESS_INTERVAL:
+            return
+        self._edited = time.monotonic()
+        try:
+            await self._message.edit(f"🔍 Validating channels... {self.done}/{self.total} checked")
+        except Exception:
+            pass
+
+    async def finish(self) -> None:
+        if self._message:
+            try:
+                await self._message.delete()
+            except Exception:
+                pass
+
+
+async def _accessible_ids(client, chat_ids: list[int], progress: _Progress) -> tuple[set[int], list]:
+    """
+    Return (IDs `client` can access, their entities).
+
+    Chats are fetched in batched GetChannels/GetChats requests first; the
+    rest (users, chats without a usable access hash) get a bounded number
+    of concurrent get_entity calls.
+    """
+    entities = await fetch_entities(client, chat_ids)
+    found = {get_peer_id(ent) for ent in entities} & set(chat_ids)
+    await progress.advance(len(found))
+
+    sem = asyncio.Semaphore(_LOOKUP_CONCURRENCY)
+
+    async def lookup(chat_id: int):
+        async with sem:
+            try:
+                return await client.get_entity(chat_id)
+            except Exception:
+                return None
+
+    rest = [cid for cid in chat_ids if cid not in found]
+    looked_up = []
+    for chat_id, entity in zip(rest, await asyncio.gather(*(lookup(cid) for cid in rest))):
+        if entity is not None:
+            found.add(chat_id)
+            looked_up.append(entity)
+    await progress.advance(len(looked_up))
+    # New chats are cached for the next start
+    await remember_entities(client, looked_up)
+    return found, entities + looked_up
 
 
 async def validate_channels(conv, inputs: list[str]) -> list[int] | None:
     """
     Validate a list of channel IDs or invite links.
-    - Numeric IDs: validate access via active client, auto-join with userbot if needed
+    - Numeric IDs: validate access via active client, then userbot, then bot
     - Invite links: auto-join with active client
     Returns list of resolved chat IDs, or None if any failed.
     """
     client = _get_active_client()
-    resolved_ids = []
-    failed = []
+    userbot = _userbot_client()
 
-    for raw in inputs:
-        # Check if it's an invite link
+    invites: dict[int, str] = {}
+    numeric: dict[int, int] = {}
+    for i, raw in enumerate(inputs):
         match = _INVITE_RE.match(raw.strip())
         if match:
-            invite_hash = match.group(1)
-            chat_id = await _try_join_invite(conv, invite_hash)
-            if chat_id is None:
-                return None  # Abort on failed join — user will retry
-            resolved_ids.append(chat_id)
+            invites[i] = match.group(1)
             continue
-
-        # Otherwise, parse as numeric ID
         try:
-            chat_id = int(raw)
+            numeric[i] = int(raw)
         except ValueError:
-            failed.append(raw)
-            continue
-
-        # Try to access with the active client
-        try:
-            await client.get_entity(chat_id)
-            resolved_ids.append(chat_id)
-            continue
-        except Exception:
             pass
 
-        # If userbot is available and active client is bot, try userbot auto-join
-        if userbot and client != userbot:
-            try:
-                await userbot.get_entity(chat_id)
-                resolved_ids.append(chat_id)
-                continue
-            except Exception:
-                pass
+    # Invite links: a few joins at a time; the first failed join stops the
+    # rest and is the only failure reported — user will retry
+    joined: dict[int, int] = {}
+    if invites:
+        join_sem = asyncio.Semaphore(_JOIN_CONCURRENCY)
+        failure: list[str] = []
+
+        async def join(index: int, invite_hash: str) -> None:
+            async with join_sem:
+                if failure:
+                    return
+                await conv.send_message("🔗 Invite link detected. Attempting to join...")
+                chat_id, report = await _try_join_invite(client, invite_hash)
+            if failure:
+                return
+            if chat_id is None:
+                failure.append(report)
+            else:
+                joined[index] = chat_id
+            await conv.send_message(report)
 
-        # If bot is not the active client, try bot as fallback
-        if client != bot:
-            try:
-                await bot.get_entity(chat_id)
-                resolved_ids.append(chat_id)
-                continue
-            except Exception:
-                pass
+        await asyncio.gather(*(join(i, h) for i, h in invites.items()))
+        if failure:
+            return None
 
-        failed.append(str(chat_id))
+    # Numeric IDs: the active client first, then the other clients for what is left
+    progress = _Progress(conv, len(set(numeric.values())))
+    await progress.start()
+    paths = [client]
+    if userbot and client != userbot:
+        paths.append(userbot)
+    if client != bot:
+        paths.append(bot)
+    accessible: set[int] = set()
+    entities = []
+    pending = list(dict.fromkeys(numeric.values()))
+    for path in paths:
+        if not pending:
+            break
+        found, path_entities = await _accessible_ids(path, pending, progress)
+        accessible |= found
+        entities += path_entities
+        pending = [cid for cid in pending if cid not in found]
+    await progress.finish()
+    # Task screens can show the new chats without another lookup
+    await remember_channel_meta(entities)
+
+    resolved_ids = []
+    failed = []
+    for i, raw in enumerate(inputs):
+        if i in joined:
+            resolved_ids.append(joined[i])
+        elif i not in numeric:
+            failed.append(raw)
+        elif numeric[i] in accessible:
+            resolved_ids.append(numeric[i])
+        else:
+            failed.append(str(numeric[i]))
 
     if failed:
         failed_list = "\n".join(f"  • {cid}" for cid in failed)
@@ -167,8 +289,16 @@ async def validate_channels(conv, inputs: list[str]) -> list[int] | None:
     return resolved_ids
 
 
+# Redis keys starting with "__" hold bot data, not tasks; such a task would vanish on restart
+RESERVED_NAME_MESSAGE = (
+    "⚠️ **Invalid Name**\n\n"
+    "Task names cannot start with __.\n"
+    "Please enter a different name:"
+)
+
+
 async def _ask_task_name(conv) -> str | None:
-    """Ask for task name, retry on duplicate. Returns None only on /cancel."""
+    """Ask for task name, retry on duplicate or reserved names. Returns None only on /cancel."""
     while True:
         response = await conv.get_response()
         text = response.text
@@ -176,6 +306,10 @@ async def _ask_task_name(conv) -> str | None:
             await conv.send_message("❌ Process aborted!")
             return None
 
+        if text.startswith("__"):
+            await conv.send_message(RESERVED_NAME_MESSAGE)
+            continue
+
         if await is_work_present(text):
             await conv.send_message(
                 "⚠️ **Duplicate Name**\n\n"
@@ -274,11 +408,17 @@ async def handle_add_task(event):
                 return
 
             # Create the task
-            await setup_work(work_name=task_name, source=source_chats, target=target_chats)
+            try:
+                await setup_work(work_name=task_name, source=source_chats, target=target_chats)
+            except RoutingCycleError as exc:
+                return await conv.send_message(
+                    await cycle_message(exc) + "\n\nThe task was not created. Use /add_task to try again."
+                )
 
             # Build success message with resolved channel names
-            source_names = [f"  • {await resolve_channel_name(cid)}" for cid in source_chats]
-            target_names = [f"  • {await resolve_channel_name(cid)}" for cid in target_chats]
+            names = await resolve_channel_names(source_chats + target_chats)
+            source_names = [f"  • {name}" for name in names[:len(source_chats)]]
+            target_names = [f"  • {name}" for name in names[len(source_chats):]]
 
             await conv.send_message(
                 "✅ **Forwarding Task Created**\n\n"
@@ -1,13 +1,20 @@
 import json
+from bisect import bisect_left, insort
+from copy import deepcopy
 from typing import Any
 
 from bot import CACHE, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, db
+from ..utils.pool import PRIORITIES
+from ..utils.routing import check_routes, invalidate_routes
+from .crossid_db import forget_task_copies, import_legacy_copies, rename_task_copies
+from .stats_db import forget_task_stats, rename_task_stats
 
 
 def _index_add(work_name: str, sources: list[int]) -> None:
     """Add a task to SOURCE_INDEX for each of its source chat IDs."""
     for src in sources:
         SOURCE_INDEX.setdefault(src, set()).add(work_name)
+    invalidate_routes()
 
 
 def _index_remove(work_name: str, sources: list[int]) -> None:
@@ -18,6 +25,83 @@ def _index_remove(work_name: str, sources: list[int]) -> None:
             bucket.discard(work_name)
             if not bucket:
                 del SOURCE_INDEX[src]
+    invalidate_routes()
+
+
+# Sorted (lowercased name, name) pairs: pages and prefix searches without scanning CACHE
+_NAME_INDEX: list[tuple[str, str]] = []
+_ACTIVE_INDEX: list[tuple[str, str]] = []
+_STOPPED_INDEX: list[tuple[str, str]] = []
+# Highest code point, closes a prefix range
+_PREFIX_END = "\U0010ffff"
+
+
+def _sorted_remove(index: list, entry: tuple) -> None:
+    i = bisect_left(index, entry)
+    if i < len(index) and index[i] == entry:
+        del index[i]
+
+
+def _names_add(work_name: str, active: bool) -> None:
+    entry = (work_name.lower(), work_name)
+    insort(_NAME_INDEX, entry)
+    insort(_ACTIVE_INDEX if active else _STOPPED_INDEX, entry)
+
+
+def _names_remove(work_name: str) -> None:
+    entry = (work_name.lower(), work_name)
+    for index in (_NAME_INDEX, _ACTIVE_INDEX, _STOPPED_INDEX):
+        _sorted_remove(index, entry)
+
+
+def rebuild_name_index() -> None:
+    """Rebuild the sorted task name indexes from CACHE (after the startup sync)."""
+    _NAME_INDEX.clear()
+    _ACTIVE_INDEX.clear()
+    _STOPPED_INDEX.clear()
+    for name, data in CACHE.items():
+        if name.startswith("__") or not isinstance(data, dict):
+            continue
+        entry = (name.lower(), name)
+        _NAME_INDEX.append(entry)
+        (_ACTIVE_INDEX if data.get("has_to_forward") else _STOPPED_INDEX).append(entry)
+    _NAME_INDEX.sort()
+    _ACTIVE_INDEX.sort()
+    _STOPPED_INDEX.sort()
+
+
+def page_work_names(
+    page: int,
+    size: int,
+    status: str | None = None,
+    prefix: str = "",
+    source: int | None = None,
+) -> tuple[list[str], int]:
+    """
+    Return (names on `page`, total matching) in name order.
+
+    `status` is "active" or "stopped", `prefix` a case-insensitive name
+    prefix and `source` a source chat ID. Apart from the source filter
+    (bounded by the tasks of that chat), the cost does not depend on the
+    number of tasks.
+    """
+    if source is not None:
+        names = sorted(SOURCE_INDEX.get(source, ()), key=str.lower)
+        if status:
+            want = status == "active"
+            names = [n for n in names if bool(CACHE.get(n, {}).get("has_to_forward")) == want]
+        if prefix:
+            names = [n for n in names if n.lower().startswith(prefix.lower())]
+        return names[page * size:(page + 1) * size], len(names)
+
+    index = {"active": _ACTIVE_INDEX, "stopped": _STOPPED_INDEX}.get(status, _NAME_INDEX)
+    lo, hi = 0, len(index)
+    if prefix:
+        key = prefix.lower()
+        lo = bisect_left(index, (key,))
+        hi = bisect_left(index, (key + _PREFIX_END,))
+    start = lo + page * size
+    return [name for _, name in index[start:min(start + size, hi)]], hi - lo
 
 
 async def get_work(work_name: str) -> dict:
@@ -43,31 +127,61 @@ async def get_tasks_for_source(source_id: int) -> list[dict]:
     return [CACHE[name] for name in task_names if name in CACHE]
 
 
+# User-editable task settings and their defaults (what /export writes and /import reads)
+TASK_SETTINGS = {
+    "show_forward_header": False,
+    "delay": 0,
+    "blacklist_words": [],
+    "has_to_edit": False,
+    "preserve_replies": False,
+    # Send as new messages instead of forwarding; "{text}" in copy_caption is the original text
+    "copy_mode": False,
+    "copy_caption": "",
+    "has_to_blacklist": False,
+    "has_to_forward": True,
+    # Send lane (utils.pool.PRIORITIES): high jumps the queue, low yields rate budget
+    "priority": "normal",
+    # Skip posts whose text and media were already sent to a target recently (see utils.fingerprint)
+    "dedup_content": False,
+}
+# Settings limited to a fixed set of values
+SETTING_CHOICES = {"priority": tuple(PRIORITIES)}
+
+
 async def setup_work(work_name: str, source: list[int], target: list[int]) -> None:
-    """Create a new forwarding task with default settings."""
+    """
+    Create a new forwarding task with default settings.
+
+    Raises RoutingCycleError if the task would close a forwarding loop.
+    """
     data = {
         "work_name": work_name,
         "source": source,
         "target": target,
-        "show_forward_header": False,
-        "delay": 0,
-        "blacklist_words": [],
-        "crossids": {},
-        "has_to_edit": False,
-        "has_to_blacklist": False,
-        "has_to_forward": True,
+        **deepcopy(TASK_SETTINGS),
     }
+    check_routes({work_name: data})
     CACHE[work_name] = data
     _index_add(work_name, source)
+    _names_add(work_name, active=True)
     await _persist(work_name, data)
 
 
 async def edit_work(work_name: str, **kwargs: Any) -> bool:
-    """Update specific fields of an existing task."""
+    """
+    Update specific fields of an existing task.
+
+    Raises RoutingCycleError, leaving the task unchanged, if new sources,
+    targets or resuming it would close a forwarding loop.
+    """
     task_data = await get_work(work_name)
     if not task_data:
         return False
 
+    routing = {"source", "target", "has_to_forward"} & kwargs.keys()
+    if routing:
+        check_routes({work_name: {**task_data, **kwargs}})
+
     # If source list is changing, update the index
     if "source" in kwargs:
         old_sources = task_data.get("source") or []
@@ -75,18 +189,60 @@ async def edit_work(work_name: str, **kwargs: Any) -> bool:
         _index_remove(work_name, old_sources)
         _index_add(work_name, new_sources)
 
+    if "has_to_forward" in kwargs and bool(kwargs["has_to_forward"]) != bool(task_data.get("has_to_forward")):
+        _names_remove(work_name)
+        _names_add(work_name, active=bool(kwargs["has_to_forward"]))
+
     task_data.update(kwargs)
     CACHE[work_name] = task_data
+    # Any setting can change how routes merge
+    invalidate_routes()
     await _persist(work_name, task_data)
     return True
 
 
+async def import_works(tasks: list[dict]) -> None:
+    """
+    Create or update many tasks at once.
+
+    All writes go to Redis in one MULTI/EXEC transaction; CACHE and the
+    indexes are only touched after it succeeded, in a single pass.
+    Updated tasks keep any field the import does not set. Raises
+    RoutingCycleError if the result would contain a forwarding loop, or the
+    Redis error if the transaction fails, leaving everything unchanged.
+    """
+    merged = []
+    for task in tasks:
+        current = CACHE.get(task["work_name"])
+        data = dict(current) if current else {}
+        data.update(task)
+        merged.append((current, data))
+    check_routes({data["work_name"]: data for _, data in merged})
+
+    pipe = db.pipeline(transaction=True)
+    for _, data in merged:
+        pipe.set(data["work_name"], json.dumps(data))
+    await pipe.execute()
+
+    for current, data in merged:
+        name = data["work_name"]
+        if current:
+            _index_remove(name, current.get("source") or [])
+            _names_remove(name)
+        CACHE[name] = data
+        _index_add(name, data["source"])
+        _names_add(name, active=bool(data.get("has_to_forward")))
+
+
 async def delete_work(work_name: str) -> None:
     """Delete a task from both cache and Redis."""
     task_data = CACHE.pop(work_name, None)
     if task_data:
         _index_remove(work_name, task_data.get("source") or [])
+        _names_remove(work_name)
     await db.delete(work_name)
+    await forget_task_stats(work_name)
+    await forget_task_copies(work_name)
 
 
 async def rename_work(old_name: str, new_name: str) -> None:
@@ -96,11 +252,34 @@ async def rename_work(old_name: str, new_name: str) -> None:
         # Update index: remove old name, add new name
         sources = data.get("source") or []
         _index_remove(old_name, sources)
+        _names_remove(old_name)
         data["work_name"] = new_name
         CACHE[new_name] = data
         _index_add(new_name, sources)
+        _names_add(new_name, active=bool(data.get("has_to_forward")))
     await db.rename(old_name, new_name)
     await _persist(new_name, CACHE.get(new_name, {}))
+    await rename_task_stats(old_name, new_name)
+    await rename_task_copies(old_name, new_name)
+
+
+async def migrate_crossids() -> None:
+    """
+    Move crossids still stored inside task JSON (older versions) to their own hashes.
+
+    Rewriting the whole task on every forward grew with the number of
+    mappings it held; they now live in crossid_db.
+    """
+    for name, data in list(CACHE.items()):
+        if not isinstance(data, dict) or "crossids" not in data:
+            continue
+        try:
+            await import_legacy_copies(name, data["crossids"] or {})
+        except Exception as e:
+            LOGS.warning("Failed to migrate crossids of task '%s': %s", name, e)
+            continue
+        del data["crossids"]
+        await _persist(name, data)
 
 
 async def _persist(work_name: str, data: dict) -> None:
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+
+from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.types import Channel, Chat, User
+from telethon.utils import get_peer_id
+
+from bot import LOGS, db
+
+# Redis hash: marked chat ID -> JSON metadata (title, username, type, members, ts)
+CHANNEL_META_KEY = "__CHANNEL_META__"
+# Entries older than this are still shown, then refreshed in the background
+_META_TTL = 6 * 3600  # seconds
+# Chats that could not be resolved are not retried on every screen render
+_FAILED_RETRY = 300  # seconds
+_FETCH_CONCURRENCY = 8
+
+_META: dict[int, dict] = {}
+_loaded = False
+_refreshing: set[int] = set()
+_failed: dict[int, float] = {}
+_fetch_sem = asyncio.Semaphore(_FETCH_CONCURRENCY)
+
+
+async def _load() -> None:
+    """Read the persisted metadata once, on first use."""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        raw = await db.hgetall(CHANNEL_META_KEY)
+    except Exception as e:
+        LOGS.warning("Failed to load channel metadata: %s", e)
+        return
+    for chat_id, value in raw.items():
+        try:
+            _META[int(chat_id)] = json.loads(value)
+        except ValueError:
+            continue
+
+
+def _chat_type(entity) -> str:
+    if isinstance(entity, Channel):
+        return "supergroup" if entity.megagroup else "channel"
+    if isinstance(entity, Chat):
+        return "group"
+    if isinstance(entity, User):
+        return "bot" if entity.bot else "user"
+    return "unknown"
+
+
+def _meta(entity, chat_id: int, members: int | None, ts: int) -> dict:
+    return {
+        "title": getattr(entity, "title", None) or getattr(entity, "first_name", None) or str(chat_id),
+        "username": getattr(entity, "username", None),
+        "type": _chat_type(entity),
+        "members": members,
+        "ts": ts,
+    }
+
+
+async def _fetch(client, chat_id: int) -> dict | None:
+    """Fetch metadata for one chat (entity plus member count) with bounded concurrency."""
+    async with _fetch_sem:
+        try:
+            entity = await client.get_entity(chat_id)
+        except Exception:
+            return None
+        members = getattr(entity, "participants_count", None)
+        if members is None and isinstance(entity, Channel):
+            try:
+                full = await client(GetFullChannelRequest(entity))
+                members = full.full_chat.participants_count
+            except Exception:
+                pass
+    return _meta(entity, chat_id, members, int(time.time()))
+
+
+async def _store(fetched: dict[int, dict]) -> None:
+    _META.update(fetched)
+    if not fetched:
+        return
+    try:
+        await db.hset(CHANNEL_META_KEY, mapping={str(k): json.dumps(v) for k, v in fetched.items()})
+    except Exception as e:
+        LOGS.warning("Failed to persist channel metadata: %s", e)
+
+
+async def _fetch_many(client, chat_ids: list[int]) -> dict[int, dict]:
+    results = await asyncio.gather(*(_fetch(client, cid) for cid in chat_ids))
+    fetched = {cid: meta for cid, meta in zip(chat_ids, results) if meta}
+    now = time.time()
+    for cid, meta in zip(chat_ids, results):
+        if meta is None:
+            _failed[cid] = now
+        else:
+            _failed.pop(cid, None)
+    await _store(fetched)
+    return fetched
+
+
+async def _refresh(client, chat_ids: list[int]) -> None:
+    try:
+        await _fetch_many(client, chat_ids)
+    finally:
+        _refreshing.difference_update(chat_ids)
+
+
+async def remember_channel_meta(entities) -> None:
+    """
+    Seed the cache with entities resolved elsewhere (e.g. channel validation).
+
+    They are stored as already stale, so the first screen showing them
+    renders at once and the member count is filled in by the background refresh.
+    """
+    await _load()
+    seeded = {}
+    for entity in entities:
+        chat_id = get_peer_id(entity)
+        if chat_id not in _META:
+            seeded[chat_id] = _meta(entity, chat_id, getattr(entity, "participants_count", None), 0)
+    await _store(seeded)
+
+
+async def get_channel_meta(client, chat_ids) -> dict[int, dict]:
+    """
+    Return {chat_id: metadata} for the chats that could be resolved.
+
+    Cached entries are returned immediately; stale ones are refreshed in
+    the background. Unknown chats are fetched concurrently before returning.
+    """
+    await _load()
+    now = time.time()
+    result, missing, stale = {}, [], []
+    for cid in dict.fromkeys(chat_ids):
+        meta = _META.get(cid)
+        if meta is None:
+            if now - _failed.get(cid, 0) > _FAILED_RETRY:
+                missing.append(cid)
+            continue
+        result[cid] = meta
+        if now - meta.get("ts", 0) > _META_TTL and cid not in _refreshing:
+            stale.append(cid)
+    if stale:
+        _refreshing.update(stale)
+        asyncio.ensure_future(_refresh(client, stale))
+    if missing:
+        result.update(await _fetch_many(client, missing))
+    return result
@@ -0,0 +1,219 @@
+import json
+import time
+from collections import OrderedDict
+
+from bot import LOGS, Var, db
+from ..utils.metrics import CROSSID_LOOKUPS, register_gauge
+
+# Forwarded copies of a source message, per task:
+#   __XID__:<task>:<day>  hash  "<source chat>:<source msg>" -> {"<target chat>": {"id", "ts", "by"}}
+# A day's hash expires as a whole once it is older than the edit/delete window.
+XID_KEY_PREFIX = "__XID__:"
+_BUCKET_SECONDS = 24 * 3600
+# Copies are looked up for two days after forwarding; the third bucket covers the day boundary
+_BUCKETS = 3
+
+
+def _day(ts: float) -> int:
+    return int(ts) // _BUCKET_SECONDS
+
+
+def _ttl(day: int) -> int:
+    """Seconds until a day's hash leaves the lookup window."""
+    return max(1, (day + _BUCKETS) * _BUCKET_SECONDS - int(time.time()))
+
+
+def _buckets(task: str) -> list[str]:
+    """Hash keys that can hold a task's copies, newest first."""
+    today = _day(time.time())
+    return [f"{XID_KEY_PREFIX}{task}:{today - i}" for i in range(_BUCKETS)]
+
+
+class CopyWindow:
+    """
+    LRU window of recently forwarded messages and their copies.
+
+    Bounded by entry count so memory stays flat however much a task
+    forwards; anything evicted is still found in Redis. Lookups that
+    missed in Redis too are kept as empty entries, so repeated edits of
+    messages that were never forwarded cost one round trip only.
+    """
+
+    __slots__ = ("size", "_entries")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> dict | None:
+        copies = self._entries.get(key)
+        if copies is not None:
+            self._entries.move_to_end(key)
+        return copies
+
+    def put(self, key: tuple, copies: dict) -> None:
+        if self.size <= 0:
+            return
+        self._entries[key] = copies
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: tuple) -> dict | None:
+        return self._entries.pop(key, None)
+
+    def drop_task(self, task: str) -> list[tuple]:
+        """Remove and return the entries of one task as (key, copies) pairs."""
+        keys = [key for key in self._entries if key[0] == task]
+        return [(key, self._entries.pop(key)) for key in keys]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+WINDOW = CopyWindow(Var.CROSSID_WINDOW)
+register_gauge("forwarder_crossid_window_entries", "Forwarded messages held in the in-memory window", lambda: len(WINDOW))
+
+
+async def remember_copies(chat_id: int, msg_id: int, by_task: dict[str, dict]) -> None:
+    """Record the copies of one source message for each task that owns some (one pipelined write)."""
+    day = _day(time.time())
+    try:
+        pipe = db.pipeline(transaction=False)
+        for task, copies in by_task.items():
+            WINDOW.put((task, chat_id, msg_id), copies)
+            key = f"{XID_KEY_PREFIX}{task}:{day}"
+            pipe.hset(key, f"{chat_id}:{msg_id}", json.dumps(copies))
+            pipe.expire(key, _ttl(day))
+        await pipe.execute()
+    except Exception as e:
+        LOGS.warning("Failed to store forwarded copies of %s/%s: %s", chat_id, msg_id, e)
+
+
+def peek_copies(task: str, chat_id: int, msg_id: int) -> dict:
+    """
+    Return the copies of a source message if they are in the window, else {}.
+
+    Never touches Redis, so callers on the send path (reply threading) pay
+    one dict lookup; only messages older than the window go unmatched.
+    """
+    copies = WINDOW.get((task, chat_id, msg_id))
+    CROSSID_LOOKUPS.inc("hit" if copies is not None else "miss")
+    return copies or {}
+
+
+async def get_copies(task: str, chat_id: int, msg_id: int) -> dict:
+    """Return {target chat: copy} for a source message, or {} if it was not forwarded."""
+    key = (task, chat_id, msg_id)
+    copies = WINDOW.get(key)
+    if copies is not None:
+        CROSSID_LOOKUPS.inc("hit")
+        return copies
+    CROSSID_LOOKUPS.inc("miss")
+    field = f"{chat_id}:{msg_id}"
+    copies = {}
+    try:
+        pipe = db.pipeline(transaction=False)
+        for bucket in _buckets(task):
+            pipe.hget(bucket, field)
+        for raw in await pipe.execute():
+            if raw:
+                copies = json.loads(raw)
+                break
+    except Exception as e:
+        LOGS.warning("Failed to look up forwarded copies for task '%s': %s", task, e)
+        return {}
+    WINDOW.put(key, copies)
+    return copies
+
+
+async def pop_copies(task: str, chat_id: int, msg_ids: list[int]) -> dict[int, dict]:
+    """
+    Remove and return the copies of deleted source messages as {msg_id: copies}.
+
+    Reading the misses and deleting every field share one round trip.
+    """
+    found, missing = {}, []
+    for msg_id in msg_ids:
+        copies = WINDOW.pop((task, chat_id, msg_id))
+        if copies is None:
+            missing.append(msg_id)
+            CROSSID_LOOKUPS.inc("miss")
+        else:
+            CROSSID_LOOKUPS.inc("hit")
+            if copies:
+                found[msg_id] = copies
+    # Copies known in memory are in Redis too; their fields are deleted all the same
+    fields = [f"{chat_id}:{msg_id}" for msg_id in msg_ids]
+    buckets = _buckets(task)
+    try:
+        pipe = db.pipeline(transaction=False)
+        if missing:
+            missing_fields = [f"{chat_id}:{msg_id}" for msg_id in missing]
+            for bucket in buckets:
+                pipe.hmget(bucket, missing_fields)
+        for bucket in buckets:
+            pipe.hdel(bucket, *fields)
+        results = await pipe.execute()
+    except Exception as e:
+        LOGS.warning("Failed to remove forwarded copies for task '%s': %s", task, e)
+        return found
+    if missing:
+        for values in results[:len(buckets)]:
+            for msg_id, raw in zip(missing, values):
+                if raw and msg_id not in found:
+                    found[msg_id] = json.loads(raw)
+    return found
+
+
+async def forget_task_copies(task: str) -> None:
+    """Drop every copy mapping of a deleted task."""
+    WINDOW.drop_task(task)
+    try:
+        await db.delete(*_buckets(task))
+    except Exception as e:
+        LOGS.warning("Failed to drop forwarded copies for task '%s': %s", task, e)
+
+
+async def rename_task_copies(old: str, new: str) -> None:
+    """Move a task's copy mappings to its new name."""
+    for (_, chat_id, msg_id), copies in WINDOW.drop_task(old):
+        WINDOW.put((new, chat_id, msg_id), copies)
+    try:
+        old_keys, new_keys = _buckets(old), _buckets(new)
+        pipe = db.pipeline(transaction=False)
+        for key in old_keys:
+            pipe.exists(key)
+        present = await pipe.execute()
+        pipe = db.pipeline(transaction=True)
+        for old_key, new_key, exists in zip(old_keys, new_keys, present):
+            if exists:
+                pipe.rename(old_key, new_key)
+        await pipe.execute()
+    except Exception as e:
+        LOGS.warning("Failed to rename forwarded copies for task '%s': %s", old, e)
+
+
+async def import_legacy_copies(task: str, crossids: dict) -> None:
+    """Move the crossids map formerly stored inside the task JSON into the day hashes."""
+    now = time.time()
+    oldest = _day(now) - _BUCKETS + 1
+    by_bucket: dict[int, dict] = {}
+    for chat_key, msg_map in crossids.items():
+        for msg_key, copies in msg_map.items():
+            stamps = [v["ts"] for v in copies.values() if isinstance(v, dict) and "ts" in v]
+            day = _day(stamps[0]) if stamps else _day(now)
+            if day < oldest:
+                continue
+            by_bucket.setdefault(day, {})[f"{chat_key}:{msg_key}"] = json.dumps(copies)
+    if not by_bucket:
+        return
+    pipe = db.pipeline(transaction=False)
+    for day, mapping in by_bucket.items():
+        key = f"{XID_KEY_PREFIX}{task}:{day}"
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, _ttl(day))
+    await pipe.execute()
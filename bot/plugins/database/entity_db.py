@@ -0,0 +1,135 @@
+import asyncio
+
+from telethon.tl.functions.channels import GetChannelsRequest
+from telethon.tl.functions.messages import GetChatsRequest
+from telethon.tl.types import Channel, InputChannel, PeerChannel, PeerChat
+from telethon.utils import get_peer_id, resolve_id
+
+from bot import LOGS, db
+
+# Redis hash per account: marked channel ID -> access hash
+ENTITY_KEY_PREFIX = "__ENTITIES__:"
+# GetChannels accepts up to 200 channels per call
+_BATCH_SIZE = 100
+_FALLBACK_CONCURRENCY = 8
+
+
+def _entity_key(client) -> str:
+    # Access hashes are per account, so the cache is keyed by the account's user ID
+    return f"{ENTITY_KEY_PREFIX}{client._self_id}"
+
+
+async def load_access_hashes(client) -> dict[int, int]:
+    """Return the persisted {marked channel ID: access hash} map for an account."""
+    try:
+        raw = await db.hgetall(_entity_key(client))
+    except Exception as e:
+        LOGS.warning("Failed to load access hashes: %s", e)
+        return {}
+    return {int(k): int(v) for k, v in raw.items()}
+
+
+async def remember_entities(client, entities) -> None:
+    """Persist the access hashes of resolved channels for the next start."""
+    mapping = {
+        str(get_peer_id(ent)): str(ent.access_hash)
+        for ent in entities
+        if isinstance(ent, Channel) and ent.access_hash is not None
+    }
+    if not mapping:
+        return
+    try:
+        await db.hset(_entity_key(client), mapping=mapping)
+    except Exception as e:
+        LOGS.warning("Failed to persist access hashes: %s", e)
+
+
+async def _get_channels(client, channels: list[InputChannel]) -> list:
+    """GetChannels for a batch; if one bad ID fails the batch, retry IDs individually."""
+    try:
+        return (await client(GetChannelsRequest(channels))).chats
+    except Exception:
+        if len(channels) == 1:
+            return []
+    sem = asyncio.Semaphore(_FALLBACK_CONCURRENCY)
+
+    async def one(channel):
+        async with sem:
+            try:
+                return (await client(GetChannelsRequest([channel]))).chats
+            except Exception:
+                return []
+
+    results = await asyncio.gather(*(one(ch) for ch in channels))
+    return [chat for chats in results for chat in chats]
+
+
+def _session_hash(client, peer_id: int, real_id: int) -> int | None:
+    """Access hash of a channel already known to the client's in-memory or session cache."""
+    cached = client._mb_entity_cache.get(real_id)
+    if cached is not None and cached.hash:
+        return cached.hash
+    try:
+        return getattr(client.session.get_input_entity(peer_id), "access_hash", None)
+    except (ValueError, KeyError):
+        return None
+
+
+async def fetch_entities(client, peer_ids) -> list:
+    """
+    Fetch the chats among `peer_ids` in as few requests as possible.
+
+    Channels with a known access hash (persisted, or in the session) are
+    fetched with batched GetChannels, basic groups with one GetChats;
+    results land in the client's entity cache and their hashes are
+    persisted. Channels without a hash are left to the caller (a dialog
+    scan or get_entity): a guessed hash fails the whole batch for user
+    accounts. User IDs are skipped.
+    """
+    hashes = await load_access_hashes(client)
+    channels, chats = [], []
+    for peer_id in set(peer_ids):
+        real_id, peer_type = resolve_id(peer_id)
+        if peer_type is PeerChannel:
+            access_hash = hashes.get(peer_id) or _session_hash(client, peer_id, real_id)
+            if access_hash:
+                channels.append(InputChannel(real_id, access_hash))
+        elif peer_type is PeerChat:
+            chats.append(real_id)
+
+    batches = [channels[i:i + _BATCH_SIZE] for i in range(0, len(channels), _BATCH_SIZE)]
+    results = await asyncio.gather(*(_get_channels(client, b) for b in batches))
+    resolved = [chat for chats_ in results for chat in chats_]
+    if chats:
+        try:
+            resolved.extend((await client(GetChatsRequest(chats))).chats)
+        except Exception as e:
+            LOGS.warning("Failed to resolve basic groups: %s", e)
+
+    await remember_entities(client, resolved)
+    return resolved
+
+
+async def warmup_entities(client, peer_ids) -> set[int]:
+    """
+    Load the access hashes of `peer_ids` into the client's entity cache.
+
+    Returns the chat IDs that could not be resolved; accounts can fall
+    back to scanning dialogs for those.
+    """
+    found = {get_peer_id(ent) for ent in await fetch_entities(client, peer_ids)}
+    return {pid for pid in peer_ids if pid < 0 and pid not in found}
+
+
+async def warmup_from_dialogs(client, missing: set[int]) -> set[int]:
+    """Scan dialogs only until every missing chat has been seen, then stop."""
+    remaining = set(missing)
+    seen = []
+    async for dialog in client.iter_dialogs():
+        if dialog.id in remaining:
+            remaining.discard(dialog.id)
+            seen.append(dialog.entity)
+            if not remaining:
+                break
+    await remember_entities(client, seen)
+    return remaining
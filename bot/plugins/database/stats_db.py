@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+from bot import LOGS, db
+
+# Counters live in hashes whose fields are "<task>|<counter>":
+#   __STATS__:total       all-time totals
+#   __STATS__:m:<minute>  per-minute buckets (expire after 2 hours)
+#   __STATS__:h:<hour>    per-hour buckets (expire after 8 days)
+STATS_KEY_PREFIX = "__STATS__:"
+_TOTAL_KEY = f"{STATS_KEY_PREFIX}total"
+_MINUTE_TTL = 2 * 3600
+_HOUR_TTL = 8 * 24 * 3600
+_FLUSH_INTERVAL = 5  # seconds
+
+COUNTERS = ("forwarded", "failed", "edited", "deleted", "deduped")
+
+# Increments not yet written to Redis: (task, counter) -> amount
+_pending: dict[tuple[str, str], int] = {}
+# Held while a batch is in flight so a rename or delete cannot interleave with it
+_flush_lock = asyncio.Lock()
+
+# Moves every "<old>|<counter>" field (ARGV[3..]) to "<new>|<counter>" in each
+# hash in KEYS; an empty ARGV[2] just deletes them. Runs atomically in Redis.
+_MOVE_FIELDS = """
+local old, new = ARGV[1], ARGV[2]
+for _, key in ipairs(KEYS) do
+    for i = 3, #ARGV do
+        local value = redis.call('HGET', key, old .. '|' .. ARGV[i])
+        if value then
+            if new ~= '' then
+                redis.call('HINCRBY', key, new .. '|' .. ARGV[i], value)
+            end
+            redis.call('HDEL', key, old .. '|' .. ARGV[i])
+        end
+    end
+end
+"""
+
+
+def count(task: str, counter: str, amount: int = 1) -> None:
+    """Record `amount` events for a task; written to Redis by the next flush."""
+    key = (task, counter)
+    _pending[key] = _pending.get(key, 0) + amount
+
+
+async def flush_stats() -> None:
+    """Write pending increments into total/minute/hour buckets in one pipeline."""
+    async with _flush_lock:
+        if not _pending:
+            return
+        batch = dict(_pending)
+        _pending.clear()
+        now = int(time.time())
+        minute_key = f"{STATS_KEY_PREFIX}m:{now // 60}"
+        hour_key = f"{STATS_KEY_PREFIX}h:{now // 3600}"
+        try:
+            pipe = db.pipeline(transaction=False)
+            for (task, counter), amount in batch.items():
+                field = f"{task}|{counter}"
+                pipe.hincrby(_TOTAL_KEY, field, amount)
+                pipe.hincrby(minute_key, field, amount)
+                pipe.hincrby(hour_key, field, amount)
+            pipe.expire(minute_key, _MINUTE_TTL)
+            pipe.expire(hour_key, _HOUR_TTL)
+            await pipe.execute()
+        except Exception as e:
+            LOGS.warning("Failed to flush stats: %s", e)
+            for key, amount in batch.items():
+                _pending[key] = _pending.get(key, 0) + amount
+
+
+async def stats_flush_loop() -> None:
+    """Flush counters every few seconds so the hot path never waits on Redis."""
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL)
+        await flush_stats()
+
+
+def _accumulate(target: dict, raw: dict) -> None:
+    for field, value in raw.items():
+        task, _, counter = field.rpartition("|")
+        bucket = target.setdefault(task, {})
+        bucket[counter] = bucket.get(counter, 0) + int(value)
+
+
+async def read_stats() -> tuple[dict, dict, dict]:
+    """
+    Return (totals, last_hour, last_day) as {task: {counter: value}}.
+
+    One pipelined round trip: the total hash, the last 60 minute buckets
+    and the last 24 hour buckets. Unflushed increments are included.
+    """
+    await flush_stats()
+    now = int(time.time())
+    minute, hour = now // 60, now // 3600
+    pipe = db.pipeline(transaction=False)
+    pipe.hgetall(_TOTAL_KEY)
+    for i in range(60):
+        pipe.hgetall(f"{STATS_KEY_PREFIX}m:{minute - i}")
+    for i in range(24):
+        pipe.hgetall(f"{STATS_KEY_PREFIX}h:{hour - i}")
+    results = await pipe.execute()
+
+    totals, last_hour, last_day = {}, {}, {}
+    _accumulate(totals, results[0])
+    for raw in results[1:61]:
+        _accumulate(last_hour, raw)
+    for raw in results[61:]:
+        _accumulate(last_day, raw)
+    return totals, last_hour, last_day
+
+
+def _live_keys() -> list[str]:
+    """The total hash plus every minute and hour bucket that has not expired yet."""
+    now = int(time.time())
+    minute, hour = now // 60, now // 3600
+    return (
+        [_TOTAL_KEY]
+        + [f"{STATS_KEY_PREFIX}m:{minute - i}" for i in range(_MINUTE_TTL // 60 + 1)]
+        + [f"{STATS_KEY_PREFIX}h:{hour - i}" for i in range(_HOUR_TTL // 3600 + 1)]
+    )
+
+
+async def _move_task_stats(old: str, new: str) -> None:
+    """Move (or with an empty `new`, drop) a task's pending and stored counters."""
+    async with _flush_lock:
+        for counter in COUNTERS:
+            amount = _pending.pop((old, counter), 0)
+            if amount and new:
+                _pending[(new, counter)] = _pending.get((new, counter), 0) + amount
+        keys = _live_keys()
+        await db.eval(_MOVE_FIELDS, len(keys), *keys, old, new, *COUNTERS)
+
+
+async def forget_task_stats(task: str) -> None:
+    """Drop a deleted task's counters so a new task with its name starts clean."""
+    try:
+        await _move_task_stats(task, "")
+    except Exception as e:
+        LOGS.warning("Failed to drop stats for task '%s': %s", task, e)
+
+
+async def rename_task_stats(old: str, new: str) -> None:
+    """Carry a task's totals and recent history over to its new name."""
+    try:
+        await _move_task_stats(old, new)
+    except Exception as e:
+        LOGS.warning("Failed to rename stats for task '%s': %s", old, e)
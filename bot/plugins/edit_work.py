@@ -1,13 +1,22 @@
+from telethon.errors import MessageNotModifiedError
+
 from . import LOGS, Button, Var, bot, events, re
-from .add_work import resolve_channel_name, validate_channels
+from .add_work import RESERVED_NAME_MESSAGE, cycle_message, resolve_channel_names, validate_channels
 from .database.addwork_db import (
     delete_work,
     edit_work,
-    get_all_work_names,
     get_work,
     is_work_present,
+    page_work_names,
     rename_work,
 )
+from .utils.pool import PRIORITIES
+from .utils.routing import RoutingCycleError
+
+# Task buttons per list page (3 per row)
+TASKS_PER_PAGE = 24
+# Search prefixes are carried in callback data, which Telegram caps at 64 bytes
+_MAX_PREFIX_BYTES = 32
 
 
 # ──────────────────────────────────────────────
@@ -27,32 +36,103 @@ def _build_task_list_buttons(work_names) -> list:
     return [list(buttons[i:i + 3]) for i in range(0, len(buttons), 3)]
 
 
+def _list_data(view: str, arg: str, page: int) -> str:
+    """Callback data for a task list page: tpg|<view>|<arg>|<page>."""
+    return f"tpg|{view}|{arg}|{page}"
+
+
+def _task_list_page(view: str = "all", arg: str = "", page: int = 0) -> tuple[str, list | None]:
+    """
+    Render one page of the task list.
+
+    `view` is "all", "active", "stopped", "search" (arg: name prefix) or
+    "source" (arg: source chat ID).
+    """
+    status = view if view in ("active", "stopped") else None
+    prefix = arg if view == "search" else ""
+    source = int(arg) if view == "source" else None
+    names, total = page_work_names(page, TASKS_PER_PAGE, status=status, prefix=prefix, source=source)
+    pages = max(1, -(-total // TASKS_PER_PAGE))
+    if page >= pages and total:
+        page = pages - 1
+        names, total = page_work_names(page, TASKS_PER_PAGE, status=status, prefix=prefix, source=source)
+
+    label = {
+        "all": "All tasks",
+        "active": "Active tasks",
+        "stopped": "Stopped tasks",
+        "search": f"Names starting with \"{arg}\"",
+        "source": f"Tasks reading from {arg}",
+    }.get(view, "All tasks")
+    if not total:
+        if view == "all":
+            return NO_TASKS_TEXT, None
+        return f"📂 **Forwarding Tasks**\n\n**{label}** : none found.", [_filter_row(view)]
+
+    first = page * TASKS_PER_PAGE + 1
+    text = (
+        f"{TASK_LIST_TEXT}\n\n"
+        f"**{label}** : {first}–{first + len(names) - 1} of {total}"
+    )
+    buttons = _build_task_list_buttons(names)
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(Button.inline("« Prev", data=_list_data(view, arg, page - 1)))
+        nav.append(Button.inline(f"{page + 1}/{pages}", data=_list_data(view, arg, page)))
+        if page < pages - 1:
+            nav.append(Button.inline("Next »", data=_list_data(view, arg, page + 1)))
+        buttons.append(nav)
+    buttons.append(_filter_row(view))
+    return text, buttons
+
+
+def _filter_row(view: str) -> list:
+    def label(name: str, title: str) -> str:
+        return f"{title}  [on]" if view == name else title
+
+    return [
+        Button.inline(label("all", "All"), data=_list_data("all", "", 0)),
+        Button.inline(label("active", "Active"), data=_list_data("active", "", 0)),
+        Button.inline(label("stopped", "Stopped"), data=_list_data("stopped", "", 0)),
+    ]
+
+
 async def _task_detail_text(task_name: str, data: dict) -> str:
     """Build the task details screen text."""
     status = "Running" if data.get("has_to_forward") else "Paused"
     status_icon = "🟢" if data.get("has_to_forward") else "🔴"
     header = "Enabled" if data.get("show_forward_header") else "Disabled"
-    mode = "Forward Header" if data.get("show_forward_header") else "Copy Mode"
+    if data.get("copy_mode"):
+        mode = "Copy (new messages)"
+    else:
+        mode = "Forward Header" if data.get("show_forward_header") else "Forward (no header)"
+    caption = f"**Caption** : {data.get('copy_caption') or 'Original text'}\n" if data.get("copy_mode") else ""
     delay = data.get("delay", 0)
     blacklist = "On" if data.get("has_to_blacklist") else "Off"
     edit_sync = "On" if data.get("has_to_edit") else "Off"
+    replies = "On" if data.get("preserve_replies") else "Off"
+    dedup = "On" if data.get("dedup_content") else "Off"
+    priority = data.get("priority", "normal").capitalize()
 
-    source_lines = []
-    for cid in data.get("source", []):
-        source_lines.append(f"  • {await resolve_channel_name(cid)}")
-    target_lines = []
-    for cid in data.get("target", []):
-        target_lines.append(f"  • {await resolve_channel_name(cid)}")
+    sources = data.get("source", [])
+    names = await resolve_channel_names(sources + data.get("target", []))
+    source_lines = [f"  • {name}" for name in names[:len(sources)]]
+    target_lines = [f"  • {name}" for name in names[len(sources):]]
 
     return (
         f"📋 **Task Details**\n\n"
         f"**Name** : {task_name}\n"
         f"**Status** : {status_icon} {status}\n"
         f"**Mode** : {mode}\n"
+        f"{caption}"
         f"**Header** : {header}\n"
         f"**Delay** : {delay}s\n"
+        f"**Priority** : {priority}\n"
         f"**Blacklist** : {blacklist}\n"
-        f"**Edit Sync** : {edit_sync}\n\n"
+        f"**Edit Sync** : {edit_sync}\n"
+        f"**Reply Threads** : {replies}\n"
+        f"**Skip Duplicates** : {dedup}\n\n"
         f"**Sources:**\n" + ("\n".join(source_lines) or "  None") + "\n\n"
         f"**Targets:**\n" + ("\n".join(target_lines) or "  None")
     )
@@ -67,6 +147,9 @@ def _task_detail_buttons(task_name: str, data: dict) -> list:
     header_label = "Disable Header" if data.get("show_forward_header") else "Enable Header"
     bl_label = "Disable Blacklist" if data.get("has_to_blacklist") else "Enable Blacklist"
     edit_label = "Disable Edit Sync" if data.get("has_to_edit") else "Enable Edit Sync"
+    reply_label = "Disable Replies" if data.get("preserve_replies") else "Enable Replies"
+    copy_label = "Forward Instead" if data.get("copy_mode") else "Copy Instead"
+    dedup_label = "Allow Duplicates" if data.get("dedup_content") else "Skip Duplicates"
 
     return [
         [
@@ -77,6 +160,10 @@ def _task_detail_buttons(task_name: str, data: dict) -> list:
             Button.inline("Edit Name", data=f"ned_{task_name}"),
             Button.inline("Edit Delay", data=f"ded_{task_name}"),
         ],
+        [
+            Button.inline("Change Priority", data=f"prio_{task_name}"),
+            Button.inline(dedup_label, data=f"ddup_{task_name}"),
+        ],
         [
             Button.inline("Edit Source", data=f"sed_{task_name}"),
             Button.inline("Edit Destination", data=f"ted_{task_name}"),
@@ -85,7 +172,14 @@ def _task_detail_buttons(task_name: str, data: dict) -> list:
             Button.inline("Edit Blacklist", data=f"bled_{task_name}"),
             Button.inline(bl_label, data=f"bkhas_{task_name}"),
         ],
-        [Button.inline(edit_label, data=f"ehas_{task_name}")],
+        [
+            Button.inline(edit_label, data=f"ehas_{task_name}"),
+            Button.inline(reply_label, data=f"rply_{task_name}"),
+        ],
+        [
+            Button.inline(copy_label, data=f"cpym_{task_name}"),
+            Button.inline("Edit Caption", data=f"cap_{task_name}"),
+        ],
         [Button.inline("Delete Task", data=f"delt_{task_name}")],
         [Button.inline("« Back", data="bek")],
     ]
@@ -125,24 +219,47 @@ NO_TASKS_TEXT = (
 )
 
 
-@bot.on(events.NewMessage(incoming=True, pattern=r"^/tasks$"))
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/tasks(?: (active|stopped|source (-?\d+)))?$"))
 async def handle_tasks(event):
+    """/tasks, /tasks active, /tasks stopped, /tasks source <chat id>"""
+    if event.sender_id not in Var.ADMINS:
+        return
+    view = event.pattern_match.group(1) or "all"
+    arg = ""
+    if view.startswith("source"):
+        view, arg = "source", event.pattern_match.group(2)
+    text, buttons = _task_list_page(view, arg)
+    await event.reply(text, buttons=buttons)
+
+
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/search (.+)$"))
+async def handle_search_tasks(event):
     if event.sender_id not in Var.ADMINS:
         return
-    work_names = await get_all_work_names()
-    if not work_names:
-        return await event.reply(NO_TASKS_TEXT)
-    buttons = _build_task_list_buttons(work_names)
-    await event.reply(TASK_LIST_TEXT, buttons=buttons)
+    prefix = event.pattern_match.group(1).strip()
+    # Keep the prefix short enough for the page buttons' callback data
+    prefix = prefix.encode("utf-8")[:_MAX_PREFIX_BYTES].decode("utf-8", "ignore").replace("|", "")
+    text, buttons = _task_list_page("search", prefix)
+    await event.reply(text, buttons=buttons)
+
+
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"tpg\|(\w+)\|(.*)\|(\d+)$")))
+async def handle_task_list_page(event):
+    view = event.pattern_match.group(1).decode("utf-8")
+    arg = event.pattern_match.group(2).decode("utf-8")
+    page = int(event.pattern_match.group(3))
+    text, buttons = _task_list_page(view, arg, page)
+    try:
+        await event.edit(text, buttons=buttons)
+    except MessageNotModifiedError:
+        # Tapping the current page indicator re-renders the same page
+        await event.answer()
 
 
 @bot.on(events.callbackquery.CallbackQuery(data=re.compile("bek")))
 async def handle_back_to_list(event):
-    work_names = await get_all_work_names()
-    if not work_names:
-        return await event.edit(NO_TASKS_TEXT)
-    buttons = _build_task_list_buttons(work_names)
-    await event.edit(TASK_LIST_TEXT, buttons=buttons)
+    text, buttons = _task_list_page()
+    await event.edit(text, buttons=buttons)
 
 
 # ──────────────────────────────────────────────
@@ -178,6 +295,10 @@ async def handle_edit_name(e):
                 if text.startswith("/cancel"):
                     return await _conv_send_task_detail(conv, task_name)
 
+                if text.startswith("__"):
+                    await conv.send_message(RESERVED_NAME_MESSAGE)
+                    continue
+
                 if await is_work_present(text):
                     await conv.send_message(
                         "⚠️ **Duplicate Name**\n\n"
@@ -251,9 +372,7 @@ async def handle_edit_delay(e):
 async def handle_edit_source(e):
     task_name = e.pattern_match.group(1).decode("utf-8")
     task_data = await get_work(task_name)
-    current_lines = []
-    for cid in task_data.get("source", []):
-        current_lines.append(f"  • {await resolve_channel_name(cid)}")
+    current_lines = [f"  • {name}" for name in await resolve_channel_names(task_data.get("source", []))]
     current = "\n".join(current_lines) or "  None"
     try:
         async with bot.conversation(e.sender_id, timeout=2000) as conv:
@@ -285,7 +404,11 @@ async def handle_edit_source(e):
                 if source_chats is None:
                     continue
 
-                await edit_work(work_name=task_name, source=source_chats)
+                try:
+                    await edit_work(work_name=task_name, source=source_chats)
+                except RoutingCycleError as exc:
+                    await conv.send_message(await cycle_message(exc) + "\n\nSend other sources or /cancel:")
+                    continue
                 await conv.send_message(
                     "✅ **Source Channels Updated**",
                     buttons=_back_button(task_name),
@@ -303,9 +426,7 @@ async def handle_edit_source(e):
 async def handle_edit_target(e):
     task_name = e.pattern_match.group(1).decode("utf-8")
     task_data = await get_work(task_name)
-    current_lines = []
-    for cid in task_data.get("target", []):
-        current_lines.append(f"  • {await resolve_channel_name(cid)}")
+    current_lines = [f"  • {name}" for name in await resolve_channel_names(task_data.get("target", []))]
     current = "\n".join(current_lines) or "  None"
     try:
         async with bot.conversation(e.sender_id, timeout=2000) as conv:
@@ -337,7 +458,11 @@ async def handle_edit_target(e):
                 if target_chats is None:
                     continue
 
-                await edit_work(work_name=task_name, target=target_chats)
+                try:
+                    await edit_work(work_name=task_name, target=target_chats)
+                except RoutingCycleError as exc:
+                    await conv.send_message(await cycle_message(exc) + "\n\nSend other targets or /cancel:")
+                    continue
                 await conv.send_message(
                     "✅ **Target Channels Updated**",
                     buttons=_back_button(task_name),
@@ -383,6 +508,43 @@ async def handle_edit_blacklist(e):
         LOGS.info("Edit blacklist conversation timed out for user %s", e.sender_id)
 
 
+# ──────────────────────────────────────────────
+#  Edit Copy Caption
+# ──────────────────────────────────────────────
+
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"cap_(.*)")))
+async def handle_edit_caption(e):
+    task_name = e.pattern_match.group(1).decode("utf-8")
+    task_data = await get_work(task_name)
+    try:
+        async with bot.conversation(e.sender_id, timeout=2000) as conv:
+            await e.delete()
+            await conv.send_message(
+                "📝 **Edit Copy Caption**\n\n"
+                f"Current caption: **{task_data.get('copy_caption') or 'Original text'}**\n\n"
+                "Send the caption used when this task copies messages.\n"
+                "{text} is replaced by the original text.\n"
+                "Example: {text}\n\nvia @MyChannel\n\n"
+                "Send /clear to keep the original text.\n"
+                "Send /cancel to go back."
+            )
+
+            response = await conv.get_response()
+            text = response.raw_text
+            if text.startswith("/cancel"):
+                return await _conv_send_task_detail(conv, task_name)
+
+            caption = "" if text.startswith("/clear") else text
+            await edit_work(work_name=task_name, copy_caption=caption)
+            await conv.send_message(
+                "✅ **Caption Updated**\n\n"
+                + ("Copies keep the original text." if not caption else "Copies use the new caption."),
+                buttons=_back_button(task_name),
+            )
+    except TimeoutError:
+        LOGS.info("Edit caption conversation timed out for user %s", e.sender_id)
+
+
 # ──────────────────────────────────────────────
 #  Toggle Actions (single-click, no conversation)
 # ──────────────────────────────────────────────
@@ -397,7 +559,10 @@ async def handle_disable_forward(e):
 @bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"enfor_(.*)")))
 async def handle_enable_forward(e):
     task_name = e.pattern_match.group(1).decode("utf-8")
-    await edit_work(work_name=task_name, has_to_forward=True)
+    try:
+        await edit_work(work_name=task_name, has_to_forward=True)
+    except RoutingCycleError as exc:
+        return await e.answer(f"⚠️ Resuming would create a {exc}", alert=True)
     await _send_task_detail(e, task_name)
 
 
@@ -428,6 +593,45 @@ async def handle_toggle_edit(e):
     await _send_task_detail(e, task_name)
 
 
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"cpym_(.*)")))
+async def handle_toggle_copy(e):
+    task_name = e.pattern_match.group(1).decode("utf-8")
+    task_data = await get_work(task_name)
+    new_value = not task_data.get("copy_mode")
+    await edit_work(work_name=task_name, copy_mode=new_value)
+    await _send_task_detail(e, task_name)
+
+
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"prio_(.*)")))
+async def handle_cycle_priority(e):
+    task_name = e.pattern_match.group(1).decode("utf-8")
+    task_data = await get_work(task_name)
+    # high → normal → low → high
+    lanes = list(PRIORITIES)
+    current = task_data.get("priority", "normal")
+    new_value = lanes[(lanes.index(current) + 1) % len(lanes)] if current in lanes else "normal"
+    await edit_work(work_name=task_name, priority=new_value)
+    await _send_task_detail(e, task_name)
+
+
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"ddup_(.*)")))
+async def handle_toggle_dedup(e):
+    task_name = e.pattern_match.group(1).decode("utf-8")
+    task_data = await get_work(task_name)
+    new_value = not task_data.get("dedup_content")
+    await edit_work(work_name=task_name, dedup_content=new_value)
+    await _send_task_detail(e, task_name)
+
+
+@bot.on(events.callbackquery.CallbackQuery(data=re.compile(r"rply_(.*)")))
+async def handle_toggle_replies(e):
+    task_name = e.pattern_match.group(1).decode("utf-8")
+    task_data = await get_work(task_name)
+    new_value = not task_data.get("preserve_replies")
+    await edit_work(work_name=task_name, preserve_replies=new_value)
+    await _send_task_detail(e, task_name)
+
+
 # ──────────────────────────────────────────────
 #  Delete Task
 # ──────────────────────────────────────────────
@@ -1,26 +1,71 @@
 import time
+from copy import copy
 
+from telethon.client.updates import EventBuilderDict
+from telethon.errors import FileReferenceExpiredError, FloodWaitError
+from telethon.tl import types
 from telethon.tl.functions.messages import ForwardMessagesRequest
-from telethon.tl.types import PeerChannel
-from telethon.utils import get_peer_id
+from telethon.tl.types import PeerChannel, PeerChat
+
+from . import CACHE, CACHE_READY, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, Var, asyncio, bot, events, userbot
+from .database.crossid_db import get_copies, peek_copies, pop_copies, remember_copies
+from .database.stats_db import count, stats_flush_loop
+from .utils.health import HealthBoard
+from .utils.listeners import ListenerTable
+from .utils.fingerprint import SEEN, fingerprint
+from .utils.media import MEDIA, SourceUnavailableError, copyable
+from .utils.metrics import (
+    DEDUP_HITS, DELETES, DELIVERY_LATENCY, EDITS, EVENTS, FAILURES, FLOOD_SECONDS, FORWARDS,
+    register_gauge,
+)
+from .utils.pool import ACCESS_ERRORS, POOL, PRIORITIES, input_peer
+from .utils.recorder import UpdateRecorder, recorder_flush_loop
+from .utils.routing import OwnSends, Route, routed_tasks, source_routes, task_lane
+from .utils.tracing import start_trace
+
+
+def _forward_kind() -> str:
+    """Return the pool kind ("bot" / "userbot") that should perform forwarding actions."""
+    mode = CACHE.get(FORWARD_MODE_KEY, "bot")
+    if mode == "userbot" and POOL.members("userbot"):
+        return "userbot"
+    return "bot"
 
-from . import CACHE, FORWARD_MODE_KEY, LOGS, SOURCE_INDEX, asyncio, bot, events, userbot
-from .database.addwork_db import edit_work, get_tasks_for_source
 
-# Crossids entries older than this (seconds) are pruned
-_CROSSIDS_TTL = 2 * 24 * 3600  # 2 days
+# Per-target health of every pool member; drives automatic bot <-> userbot failover
+HEALTH = HealthBoard()
 
 
-def _get_active_client():
-    """Return the client that should perform forwarding actions."""
-    mode = CACHE.get(FORWARD_MODE_KEY, "bot")
-    if mode == "userbot" and userbot:
-        return userbot
-    return bot
+def _pick_member(chat: int):
+    """Pool member to send to `chat`: the mode's member unless it is degraded."""
+    kind = _forward_kind()
+    preferred = POOL.for_target(kind, chat)
+    other = "userbot" if kind == "bot" else "bot"
+    alternate = POOL.for_target(other, chat) if POOL.members(other) else None
+    return HEALTH.choose(chat, preferred, alternate)
+
+
+def _copy_id(value) -> int | None:
+    """Target message ID of a stored copy (int in the old format, dict in the new)."""
+    if value is None:
+        return None
+    return int(value["id"] if isinstance(value, dict) else value)
 
 
-# Dedup cache: prevents double-forwarding when both clients are in the same channel.
+def _owner_member(value, kind: str, chat: int):
+    """Pool member that sent a forwarded copy, falling back to the target's current member."""
+    owner = POOL.get(value.get("by")) if isinstance(value, dict) else None
+    return owner or POOL.for_target(kind, chat)
+
+
+# One listener per source: the other client's copy of an already processed update is dropped on arrival.
 # The mode setting only controls which client SENDS — any client can LISTEN.
+LISTENERS = ListenerTable()
+LISTENERS.register("bot", bot)
+if userbot:
+    LISTENERS.register("userbot", userbot)
+
+# Dedup cache: safety net for the moment a listener is handed over.
 _processed: dict[tuple, float] = {}
 _PROCESSED_TTL = 10  # seconds
 
@@ -69,279 +114,619 @@ def _dedup_check_delete(chat_id: int, msg_ids: tuple) -> bool:
     return False
 
 
-async def _send_to_target(client, chat, e, source_peer_id: int, show_header: bool):
-    """Send a single message to one target chat. Returns (chat, msg_id) or None."""
-    try:
-        from_peer = await client.get_input_entity(source_peer_id)
-        to_peer = await client.get_input_entity(chat)
-
-        result = await client(ForwardMessagesRequest(
-            from_peer=from_peer,
-            id=[e.message.id],
-            to_peer=to_peer,
-            drop_author=not show_header,
-            silent=True,
-        ))
-
-        new_msg_id = None
-        for update in result.updates:
-            if hasattr(update, "id") and hasattr(update, "message"):
-                new_msg_id = update.id
-                break
-        if new_msg_id is None and result.updates:
-            for update in result.updates:
-                if hasattr(update, "id"):
-                    new_msg_id = update.id
-                    break
-
-        return (chat, new_msg_id) if new_msg_id else None
-    except Exception as exc:
-        LOGS.warning("Failed to forward to chat %s: %s", chat, exc)
+def _already_processed(update, chat_id: int) -> bool:
+    """Whether a routed update was already handled, checked in the dedup caches without recording it."""
+    if isinstance(update, types.UpdateDeleteChannelMessages):
+        return (chat_id, tuple(update.messages)) in _processed_deletes
+    message = getattr(update, "message", None)
+    msg_id = message.id if isinstance(message, types.Message) else getattr(update, "id", None)
+    if isinstance(update, _EDIT_UPDATES):
+        return (chat_id, msg_id, int(time.time() / 2)) in _processed_edits
+    return (chat_id, msg_id) in _processed
+
+
+def _reply_id(e) -> int | None:
+    """Source message `e` replies to, if it is in the same chat."""
+    reply = e.message.reply_to
+    if not isinstance(reply, types.MessageReplyHeader) or reply.reply_to_peer_id:
         return None
+    return reply.reply_to_msg_id
 
 
-async def _forward_message(e, task: dict) -> None:
-    """Forward a new message to all target channels for a given task."""
-    if task.get("delay"):
-        await asyncio.sleep(task["delay"])
+def _reply_copy_id(task: str, source_peer_id: int, reply_id: int | None, chat: int) -> int | None:
+    """Target message to reply to in `chat`: the task's copy of the replied-to post, if known."""
+    if not reply_id:
+        return None
+    return _copy_id(peek_copies(task, source_peer_id, reply_id).get(str(chat)))
+
+
+def _copy_text(message, template: str) -> tuple[str, list | None]:
+    """
+    Text and entities of a copied message after applying the task's caption template.
+
+    "{text}" in the template stands for the original text; entities are
+    shifted past whatever precedes it (offsets count UTF-16 code units).
+    """
+    text = message.message or ""
+    entities = message.entities
+    if not template:
+        return text, entities
+    if "{text}" not in template:
+        return template, None
+    prefix, _, suffix = template.partition("{text}")
+    shift = len(prefix.encode("utf-16-le")) // 2
+    if entities and shift:
+        entities = [copy(ent) for ent in entities]
+        for ent in entities:
+            ent.offset += shift
+    return prefix + text + suffix, entities
+
+
+async def _copy_message(
+    client, e, from_chat: int, from_id: int, to_peer, template: str, reply_to: int | None,
+) -> int:
+    """
+    Send `e` to `to_peer` as a new message, reusing the media of
+    (`from_chat`, `from_id`) by reference: the source, or a chained copy of it.
+    """
+    text, entities = _copy_text(e.message, template)
+    relay = None if from_id == e.message.id else from_id
+    for refresh in (False, True):
+        media = await MEDIA.get(client, e.message, from_chat, refresh=refresh, msg_id=relay)
+        try:
+            sent = await client.send_message(
+                to_peer, text, file=media, formatting_entities=entities,
+                link_preview=isinstance(e.message.media, types.MessageMediaWebPage),
+                silent=True, reply_to=reply_to,
+            )
+            return sent.id
+        except FileReferenceExpiredError:
+            if refresh:
+                raise
+    return None
+
+
+def _forwarded_id(result) -> int | None:
+    """ID of the new message in the updates returned by ForwardMessagesRequest."""
+    for update in result.updates:
+        if hasattr(update, "id") and hasattr(update, "message"):
+            return update.id
+    for update in result.updates:
+        if hasattr(update, "id"):
+            return update.id
+    return None
+
+
+# Copies posted into chats that other tasks read; their echo is not forwarded again
+OWN_SENDS = OwnSends()
+
+
+async def _send_to_target(chat, *args, **kwargs):
+    """Send a single message to one target chat. Returns (chat, msg_id, member) or None."""
+    if chat not in SOURCE_INDEX:
+        return await _deliver(chat, *args, **kwargs)
+    # Another task reads this chat and gets the message from the origin event
+    OWN_SENDS.begin(chat)
+    result = None
+    try:
+        result = await _deliver(chat, *args, **kwargs)
+        return result
+    finally:
+        OWN_SENDS.end(chat, result[1] if result else None)
+
+
+async def _deliver(
+    chat, e, source_peer_id: int, show_header: bool, trace=None,
+    reply_to: int | None = None, copy_template: str | None = None, lane: int = PRIORITIES["normal"],
+    relay: tuple[int, int] | None = None,
+):
+    """
+    Deliver `e` to one target chat, failing over between pool members.
+
+    `reply_to` is the target message the copy should reply to, if any.
+    With `copy_template` set (possibly "") the message is sent as a new
+    message instead of forwarded; media that cannot be copied is still
+    forwarded, without the header. `lane` is the send priority (see
+    pool.PRIORITIES); it only decides the order of waiting for rate budget.
+    `relay` is the (chat, message) to send from instead of the source: a
+    chained task's copy, readable by the accounts posting in that chat.
+    """
+    from_chat, from_id = relay or (source_peer_id, e.message.id)
+    member = _pick_member(chat)
+    tried = set()
+    while member is not None and member.name not in tried:
+        tried.add(member.name)
+        if not POOL.can_read(member, from_chat):
+            member = POOL.reader_for(chat, from_chat, tried, member.kind)
+            continue
+        client = member.client
+        try:
+            try:
+                from_peer = await input_peer(client, from_chat)
+            except ACCESS_ERRORS as exc:
+                # The source is out of this account's reach, not the target
+                LOGS.warning("%s cannot read source %s: %s", member.name, from_chat, exc)
+                POOL.cannot_read(member, from_chat)
+                member = POOL.reader_for(chat, from_chat, tried, member.kind)
+                continue
+            to_peer = await input_peer(client, chat)
+            if trace:
+                trace.mark("resolved", chat)
+
+            await member.acquire(lane)
+            if trace:
+                trace.mark("budget", chat)
+            started = time.monotonic()
+            if copy_template is not None and copyable(e.message):
+                new_msg_id = await _copy_message(client, e, from_chat, from_id, to_peer, copy_template, reply_to)
+            else:
+                new_msg_id = _forwarded_id(await client(ForwardMessagesRequest(
+                    from_peer=from_peer,
+                    id=[from_id],
+                    to_peer=to_peer,
+                    drop_author=copy_template is not None or not show_header,
+                    silent=True,
+                    reply_to=types.InputReplyToMessage(reply_to_msg_id=reply_to) if reply_to else None,
+                )))
+            HEALTH.record(member.name, chat, True, time.monotonic() - started)
+            if trace:
+                trace.mark("sent", chat)
+            DELIVERY_LATENCY.observe(time.time() - e.message.date.timestamp())
+
+            return (chat, new_msg_id, member.name) if new_msg_id else None
+        except FloodWaitError as exc:
+            member.flood_wait(exc.seconds)
+            HEALTH.record(member.name, chat, False, flood=exc.seconds)
+            FLOOD_SECONDS.inc(member.name, value=exc.seconds)
+            FAILURES.inc("forward", "FloodWaitError")
+            if trace:
+                trace.mark("flood_wait", chat)
+            LOGS.warning("FloodWait of %ss on %s forwarding to chat %s", exc.seconds, member.name, chat)
+            member = _pick_member(chat)  # fails over if the other client is healthier
+        except SourceUnavailableError as exc:
+            # The media to reuse is out of this account's reach, not the target
+            LOGS.warning("%s cannot copy from %s: %s", member.name, from_chat, exc)
+            POOL.cannot_read(member, from_chat)
+            member = POOL.reader_for(chat, from_chat, tried, member.kind)
+        except ACCESS_ERRORS as exc:
+            HEALTH.record(member.name, chat, False)
+            FAILURES.inc("forward", type(exc).__name__)
+            LOGS.warning("%s cannot forward to chat %s: %s", member.name, chat, exc)
+            if trace:
+                trace.mark("no_access", chat)
+            member = POOL.no_access(member, chat)
+        except Exception as exc:
+            HEALTH.record(member.name, chat, False)
+            FAILURES.inc("forward", type(exc).__name__)
+            LOGS.warning("Failed to forward to chat %s: %s", chat, exc)
+            if trace:
+                trace.mark("failed", chat)
+            return None
+    return None
+
+
+# (content, target) keys being sent right now; a repost waits for the outcome
+_content_sending: dict[bytes, asyncio.Event] = {}
+
+
+async def _claim_content(key: bytes) -> bool:
+    """
+    Return True if content `key` still has to be sent, reserving it until
+    _release_content. Only successful sends are remembered in SEEN, so a
+    failed send leaves the content to the next source that posts it.
+    """
+    while key in _content_sending:
+        await _content_sending[key].wait()
+    if key in SEEN:
+        return False
+    _content_sending[key] = asyncio.Event()
+    return True
+
+
+def _release_content(key: bytes, delivered: bool) -> None:
+    if delivered:
+        SEEN.add(key)
+    sending = _content_sending.pop(key, None)
+    if sending:
+        sending.set()
+
+
+# Forwards currently sleeping on a delay or waiting on sends (queue depth gauge)
+_inflight = {"forward": 0}
+
+
+async def _forward_message(
+    e, route: Route, source_peer_id: int, trace=None, chain: set | None = None, relay: tuple[int, int] | None = None,
+) -> None:
+    """
+    Forward a new message along one merged route (see routing.Route).
+
+    `chain` holds the tasks already handling this origin message; tasks
+    reading the route's targets are started from here, sending from the
+    copy in the target (`relay`). Copies are still recorded under the
+    origin message, so its edits and deletes reach every chained task.
+    """
+    _inflight["forward"] += 1
+    try:
+        await _forward_message_inner(e, route, source_peer_id, trace, chain, relay)
+    finally:
+        _inflight["forward"] -= 1
+        if trace:
+            trace.finish()
+
 
-    client = _get_active_client()
-    target_chats = task["target"]
-    cross_ids = task["crossids"]
-    blacklist_words = task["blacklist_words"]
-    show_header = task.get("show_forward_header", False)
-    use_blacklist = task.get("has_to_blacklist", False)
+async def _forward_message_inner(
+    e, route: Route, source_peer_id: int, trace=None, chain: set | None = None, relay: tuple[int, int] | None = None,
+) -> None:
+    if route.delay:
+        await asyncio.sleep(route.delay)
+        if trace:
+            trace.mark("delay")
 
     # Blacklist check — done once, skip entire message if matched
-    if use_blacklist and blacklist_words:
+    if route.blacklist:
         message_text = (e.message.message or "").lower()
-        if any(word in message_text for word in blacklist_words):
+        if any(word in message_text for word in route.blacklist):
+            if trace:
+                trace.mark("blacklisted")
             return
 
-    # Resolve source peer ID once for correct -100 prefixed format
-    ch = await e.get_chat()
-    source_peer_id = get_peer_id(ch) if ch else e.chat_id
-
-    # Fire off all targets in parallel
-    coros = [_send_to_target(client, chat, e, source_peer_id, show_header) for chat in target_chats]
-    results = await asyncio.gather(*coros, return_exceptions=True)
-
-    # Collect crossids from successful sends (non-header mode only)
+    # Content dedup — targets that got the same post from another source recently are skipped
+    targets = list(route.targets)
+    claimed: dict[int, bytes] = {}
+    if route.dedup:
+        digest = fingerprint(e.message)
+        if digest is not None:
+            fresh = []
+            for chat in targets:
+                key = digest + chat.to_bytes(8, "little", signed=True)
+                if await _claim_content(key):
+                    claimed[chat] = key
+                    fresh.append(chat)
+                    continue
+                DEDUP_HITS.inc("content")
+                for owner in route.targets[chat]:
+                    count(owner, "deduped")
+            targets = fresh
+            if trace:
+                trace.mark("fingerprint")
+
+    # Fire off all targets in parallel, threading replies onto the earlier copies
+    reply_id = _reply_id(e) if route.preserve_replies else None
+    coros = [
+        _send_to_target(
+            chat, e, source_peer_id, route.show_header, trace,
+            _reply_copy_id(route.targets[chat][0], source_peer_id, reply_id, chat), route.copy_template,
+            route.lanes[chat], relay,
+        )
+        for chat in targets
+    ]
+    results = [None] * len(targets)
+    try:
+        results = await asyncio.gather(*coros, return_exceptions=True)
+    finally:
+        # Claimed content counts as sent only where the send succeeded
+        for chat, result in zip(targets, results):
+            if chat in claimed:
+                _release_content(claimed[chat], result is not None and not isinstance(result, Exception))
+
+    # Credit every owning task of each target; collect the copies per task
     ts = int(time.time())
-    needs_persist = False
-    for i, result in enumerate(results):
-        if isinstance(result, Exception):
-            LOGS.warning("Failed to forward message to target[%d]: %s", i, result)
-        elif result is not None:
-            chat, msg_id = result
+    copies: dict[str, dict] = {}
+    delivered = []
+    for chat, result in zip(targets, results):
+        owners = route.targets[chat]
+        if isinstance(result, Exception) or result is None:
+            if result is not None:
+                LOGS.warning("Failed to forward message to chat %s: %s", chat, result)
+            for owner in owners:
+                count(owner, "failed")
+            continue
+        _, msg_id, member_name = result
+        delivered.append((chat, msg_id))
+        for owner in owners:
+            FORWARDS.inc(owner, chat)
+            count(owner, "forwarded")
             if msg_id:
-                entry = cross_ids.setdefault(str(source_peer_id), {}).setdefault(str(e.id), {})
-                entry[str(chat)] = {"id": msg_id, "ts": ts}
-                needs_persist = True
+                copies.setdefault(owner, {})[str(chat)] = {"id": msg_id, "ts": ts, "by": member_name}
 
     # Single Redis write after all targets
-    if needs_persist:
-        await edit_work(task["work_name"], crossids=cross_ids)
-
-
-async def _forward_edit(e, task: dict) -> None:
-    """Forward an edited message to all target channels for a given task."""
-    client = _get_active_client()
-    cross_ids = task["crossids"]
+    if copies:
+        await remember_copies(source_peer_id, e.id, copies)
+
+    # Tasks reading a target send the new copy right away instead of waiting
+    # for it to arrive there as an update (whose echo is then skipped)
+    if chain is None:
+        chain = set(route.tasks)
+    for chat, msg_id in delivered:
+        if not msg_id:
+            continue  # copy ID unknown: its update is not marked as ours and goes the normal way
+        for downstream in source_routes(chat):
+            downstream = downstream.without(chain)
+            if downstream is None:
+                continue
+            chain.update(downstream.tasks)
+            asyncio.ensure_future(_forward_message(
+                e, downstream, source_peer_id, trace.fork(downstream.label) if trace else None, chain,
+                (chat, msg_id),
+            ))
+
+
+async def _forward_edit(e, task: dict, source_peer_id: int, done: set | None = None) -> None:
+    """
+    Forward an edited message to all target channels for a given task.
+
+    `done` collects the (chat, message) copies already edited for this
+    update, so a copy shared by merged tasks is edited once.
+    """
+    kind = _forward_kind()
     blacklist_words = task["blacklist_words"]
     use_blacklist = task.get("has_to_blacklist", False)
 
-    ch = await e.get_chat()
-    chat_id_key = str(get_peer_id(ch)) if ch else str(e.chat_id)
-    msg_id_key = str(e.id)
-
-    mapped = cross_ids.get(chat_id_key, {}).get(msg_id_key)
-    if not mapped:
-        return
-
     if use_blacklist and blacklist_words:
         message_text = (e.message.message or "").lower()
         if any(word in message_text for word in blacklist_words):
             return
 
+    mapped = await get_copies(task["work_name"], source_peer_id, e.id)
+    if not mapped:
+        return
+
+    # Copies carry the caption template; forwarded messages mirror the source
+    if task.get("copy_mode"):
+        text, entities = _copy_text(e.message, task.get("copy_caption", ""))
+    else:
+        text, entities = e.message.text or "", e.message.entities
+
     for chat_str, value in mapped.items():
         try:
             # Backward compat: value can be int (old format) or dict (new format)
             target_msg_id = value["id"] if isinstance(value, dict) else value
             chat = int(chat_str)
+            if done is not None:
+                if (chat, int(target_msg_id)) in done:
+                    continue
+                done.add((chat, int(target_msg_id)))
+            # Edit through the account that owns the forwarded copy
+            member = _owner_member(value, kind, chat)
+            await member.acquire(task_lane(task))
             if e.message.media:
-                await client.edit_message(
+                await member.client.edit_message(
                     chat,
                     int(target_msg_id),
-                    text=e.message.text or "",
+                    text=text,
                     file=e.message.media,
-                    formatting_entities=e.message.entities,
+                    formatting_entities=entities,
                 )
             else:
-                await client.edit_message(
+                await member.client.edit_message(
                     chat,
                     int(target_msg_id),
-                    text=e.message.text or "",
-                    formatting_entities=e.message.entities,
+                    text=text,
+                    formatting_entities=entities,
                 )
+            EDITS.inc(task["work_name"], chat)
+            count(task["work_name"], "edited")
+        except FloodWaitError as exc:
+            member.flood_wait(exc.seconds)
+            FLOOD_SECONDS.inc(member.name, value=exc.seconds)
+            FAILURES.inc("edit", "FloodWaitError")
+            LOGS.warning("FloodWait of %ss forwarding edit to chat %s", exc.seconds, chat_str)
         except Exception as exc:
+            FAILURES.inc("edit", type(exc).__name__)
             LOGS.warning("Failed to forward edit to chat %s: %s", chat_str, exc)
 
 
-async def _delete_forwarded(chat_id: int, deleted_ids: list[int], task: dict) -> None:
-    """Delete forwarded messages in target channels when source messages are deleted."""
-    client = _get_active_client()
-    cross_ids = task["crossids"]
-    chat_id_key = str(chat_id)
+async def _delete_forwarded(chat_id: int, deleted_ids: list[int], task: dict, done: set | None = None) -> None:
+    """
+    Delete forwarded messages in target channels when source messages are deleted.
 
-    chat_map = cross_ids.get(chat_id_key, {})
-    if not chat_map:
-        return
-
-    for msg_id in deleted_ids:
-        msg_id_key = str(msg_id)
-        mapped = chat_map.get(msg_id_key)
-        if not mapped:
-            continue
+    `done` works as in _forward_edit: copies shared by merged tasks are deleted once.
+    """
+    kind = _forward_kind()
+    popped = await pop_copies(task["work_name"], chat_id, deleted_ids)
 
+    # Group copies by (owning member, target chat) so each pair is one request
+    batches: dict[tuple, list[int]] = {}
+    for mapped in popped.values():
         for chat_str, value in mapped.items():
-            try:
-                target_msg_id = value["id"] if isinstance(value, dict) else value
-                await client.delete_messages(int(chat_str), int(target_msg_id))
-            except Exception as exc:
-                LOGS.warning("Failed to delete message in chat %s: %s", chat_str, exc)
-
-        chat_map.pop(msg_id_key, None)
-
-    cross_ids[chat_id_key] = chat_map
-    await edit_work(task["work_name"], crossids=cross_ids)
-
+            target_msg_id = value["id"] if isinstance(value, dict) else value
+            if done is not None:
+                if (int(chat_str), int(target_msg_id)) in done:
+                    continue
+                done.add((int(chat_str), int(target_msg_id)))
+            member = _owner_member(value, kind, int(chat_str))
+            batches.setdefault((member, int(chat_str)), []).append(int(target_msg_id))
 
-# ──────────────────────────────────────────────
-#  Crossids cleanup (hourly, prunes entries > 2 days)
-# ──────────────────────────────────────────────
+    if not batches:
+        return
 
-async def _cleanup_crossids():
-    """Periodically prune old crossids entries to prevent unbounded growth."""
-    while True:
-        await asyncio.sleep(3600)  # Run every hour
+    for (member, chat), msg_ids in batches.items():
         try:
-            now = int(time.time())
-            for task_name, task in list(CACHE.items()):
-                if not isinstance(task, dict) or "crossids" not in task:
-                    continue
-                cross_ids = task["crossids"]
-                changed = False
-                for chat_key in list(cross_ids.keys()):
-                    msg_map = cross_ids[chat_key]
-                    for msg_key in list(msg_map.keys()):
-                        entry = msg_map[msg_key]
-                        # Check any target's timestamp; if all are old format (no ts), skip
-                        should_prune = False
-                        for value in entry.values():
-                            if isinstance(value, dict) and "ts" in value:
-                                if now - value["ts"] > _CROSSIDS_TTL:
-                                    should_prune = True
-                                break
-                        if should_prune:
-                            del msg_map[msg_key]
-                            changed = True
-                    # Clean up empty chat maps
-                    if not msg_map:
-                        del cross_ids[chat_key]
-                        changed = True
-                if changed:
-                    await edit_work(task_name, crossids=cross_ids)
-            LOGS.info("Crossids cleanup completed.")
+            await member.acquire(task_lane(task))
+            await member.client.delete_messages(chat, msg_ids)
+            DELETES.inc(task["work_name"], chat, value=len(msg_ids))
+            count(task["work_name"], "deleted", len(msg_ids))
+        except FloodWaitError as exc:
+            member.flood_wait(exc.seconds)
+            FLOOD_SECONDS.inc(member.name, value=exc.seconds)
+            FAILURES.inc("delete", "FloodWaitError")
+            LOGS.warning("FloodWait of %ss deleting messages in chat %s", exc.seconds, chat)
         except Exception as exc:
-            LOGS.warning("Crossids cleanup error: %s", exc)
+            FAILURES.inc("delete", type(exc).__name__)
+            LOGS.warning("Failed to delete message in chat %s: %s", chat, exc)
 
 
-# Start the cleanup task
-asyncio.ensure_future(_cleanup_crossids())
+# Flush stats counters in the background (copy mappings expire in Redis, see crossid_db)
+asyncio.ensure_future(stats_flush_loop())
 
 
 # ──────────────────────────────────────────────
 #  Shared handler logic
 # ──────────────────────────────────────────────
 
-async def _on_new_message(e):
-    if getattr(e, "out", False) and not getattr(e, "is_channel", False):
-        return
+async def _on_new_message(e, chat_id: int):
+    trace = start_trace(chat_id, e.id, time.monotonic())
     try:
-        ch = await e.get_chat()
-        if not ch:
-            return
-        chat_id = get_peer_id(ch)
         if _dedup_check(chat_id, e.id):
+            DEDUP_HITS.inc("new")
             return
-        tasks = await get_tasks_for_source(chat_id)
-        for task in tasks:
-            if task.get("has_to_forward"):
-                asyncio.ensure_future(_forward_message(e, task))
+        if OWN_SENDS and await OWN_SENDS.is_own(chat_id, e.id):
+            # Our own copy; chained tasks already got it from the origin message
+            DEDUP_HITS.inc("own")
+            return
+        if trace:
+            trace.mark("dedup")
+        routes = source_routes(chat_id)
+        if trace:
+            trace.mark("lookup")
+        chain = {name for route in routes for name in route.tasks}
+        for route in routes:
+            route_trace = trace.fork(route.label) if trace else None
+            asyncio.ensure_future(_forward_message(e, route, chat_id, route_trace, chain))
     except Exception as exc:
         LOGS.warning("Error in new message handler: %s", exc)
 
 
-async def _on_message_edit(e):
-    if getattr(e, "out", False) and not getattr(e, "is_channel", False):
-        return
+async def _on_message_edit(e, chat_id: int):
     try:
-        ch = await e.get_chat()
-        if not ch:
-            return
-        chat_id = get_peer_id(ch)
         if _dedup_check_edit(chat_id, e.id):
+            DEDUP_HITS.inc("edit")
             return
-        tasks = await get_tasks_for_source(chat_id)
+        tasks = routed_tasks(chat_id)
+        done = set()
         for task in tasks:
             if task.get("has_to_edit"):
-                asyncio.ensure_future(_forward_edit(e, task))
+                asyncio.ensure_future(_forward_edit(e, task, chat_id, done))
     except Exception as exc:
         LOGS.warning("Error in message edit handler: %s", exc)
 
 
-async def _on_message_delete(e):
+async def _on_message_delete(chat_id: int, deleted_ids: list[int]):
     try:
-        chat_id = None
-        if getattr(e, "channel_id", None):
-            chat_id = get_peer_id(PeerChannel(e.channel_id))
-        else:
-            try:
-                ch = await e.get_chat()
-                if ch:
-                    chat_id = get_peer_id(ch)
-            except Exception:
-                pass
-        if not chat_id:
-            return
-        if _dedup_check_delete(chat_id, tuple(e.deleted_ids)):
+        if _dedup_check_delete(chat_id, tuple(deleted_ids)):
+            DEDUP_HITS.inc("delete")
             return
-        tasks = await get_tasks_for_source(chat_id)
+        tasks = routed_tasks(chat_id)
+        done = set()
         for task in tasks:
             if task.get("has_to_forward"):
-                asyncio.ensure_future(_delete_forwarded(chat_id, e.deleted_ids, task))
+                asyncio.ensure_future(_delete_forwarded(chat_id, deleted_ids, task, done))
     except Exception as exc:
         LOGS.warning("Error in message delete handler: %s", exc)
 
 
 # ──────────────────────────────────────────────
-#  Register handlers on bot (always)
+#  Raw update fast path
 # ──────────────────────────────────────────────
+#
+# Handlers listen for raw updates instead of NewMessage/MessageEdited/
+# MessageDeleted so that chats without a task are rejected from the
+# update's peer alone: no event object, no get_chat(), no network.
+
+_NEW_MESSAGE_UPDATES = (
+    types.UpdateNewMessage,
+    types.UpdateNewChannelMessage,
+    types.UpdateShortMessage,
+    types.UpdateShortChatMessage,
+)
+_EDIT_UPDATES = (types.UpdateEditMessage, types.UpdateEditChannelMessage)
+_ROUTED_UPDATES = _NEW_MESSAGE_UPDATES + _EDIT_UPDATES + (types.UpdateDeleteChannelMessages,)
+
+
+def _peer_to_id(peer) -> int:
+    """Marked peer ID (-100 prefix for channels), same as get_peer_id but without checks."""
+    if isinstance(peer, PeerChannel):
+        return -1000000000000 - peer.channel_id
+    if isinstance(peer, PeerChat):
+        return -peer.chat_id
+    return peer.user_id
+
+
+def _update_route(update) -> tuple[int, bool, bool] | None:
+    """Return (chat_id, is_out, is_channel) for a routed update, or None if it has no peer."""
+    message = getattr(update, "message", None)
+    if isinstance(message, types.Message):
+        peer = message.peer_id
+        return _peer_to_id(peer), message.out, isinstance(peer, PeerChannel)
+    if isinstance(update, types.UpdateShortChatMessage):
+        return -update.chat_id, update.out, False
+    if isinstance(update, types.UpdateShortMessage):
+        return update.user_id, update.out, False
+    return None
+
+
+# Optional capture of the live update stream for offline replay (benchmarks/replay.py)
+RECORDER = UpdateRecorder(Var.RECORD_UPDATES) if Var.RECORD_UPDATES else None
+if RECORDER:
+    asyncio.ensure_future(recorder_flush_loop(RECORDER))
+
+
+def _build_event(client, update, builder):
+    """Build a Telethon event from a raw update exactly like the client's dispatcher."""
+    return EventBuilderDict(client, update, None)[builder]
+
+
+async def _route_update(name: str, client, update, incoming_only: bool) -> None:
+    """Entry point for every routed update from either client."""
+    if not CACHE_READY.is_set():
+        # Updates caught up during startup wait until SOURCE_INDEX is loaded
+        await CACHE_READY.wait()
+    if isinstance(update, types.UpdateDeleteChannelMessages):
+        chat_id = -1000000000000 - update.channel_id
+        if RECORDER:
+            RECORDER.record(name, update, chat_id)
+        if chat_id in SOURCE_INDEX and LISTENERS.accept(name, chat_id, _already_processed(update, chat_id)):
+            EVENTS.inc(name, "delete")
+            await _on_message_delete(chat_id, update.messages)
+        return
 
-@bot.on(events.NewMessage(incoming=True))
-async def handle_new_message_bot(e):
-    await _on_new_message(e)
+    route = _update_route(update)
+    if route is None:
+        return
+    chat_id, is_out, is_channel = route
+    if RECORDER:
+        RECORDER.record(name, update, chat_id, is_out)
+    if chat_id not in SOURCE_INDEX:
+        return
+    # Bot only reacts to incoming messages; userbot also sees channel posts as "out"
+    if is_out and (incoming_only or not is_channel):
+        return
+    if not LISTENERS.accept(name, chat_id, _already_processed(update, chat_id)):
+        return
 
+    if isinstance(update, _EDIT_UPDATES):
+        EVENTS.inc(name, "edit")
+        e = _build_event(client, update, events.MessageEdited)
+        if e:
+            await _on_message_edit(e, chat_id)
+    else:
+        EVENTS.inc(name, "new")
+        e = _build_event(client, update, events.NewMessage)
+        if e:
+            await _on_new_message(e, chat_id)
+
+
+# Queue depths, computed only when /metrics is scraped
+register_gauge("forwarder_inflight_forwards", "Forwards waiting on delay or sends", lambda: _inflight["forward"])
+register_gauge(
+    "forwarder_dedup_entries", "Entries in the dedup caches",
+    lambda: len(_processed) + len(_processed_edits) + len(_processed_deletes),
+)
+register_gauge("forwarder_loop_tasks", "Pending asyncio tasks on the shared loop", lambda: len(asyncio.all_tasks()))
+register_gauge(
+    "forwarder_blocked_members", "Pool members paused by FloodWait",
+    lambda: sum(1 for m in POOL.members() if m.blocked_until > time.monotonic()),
+)
 
-@bot.on(events.MessageEdited(incoming=True))
-async def handle_message_edit_bot(e):
-    await _on_message_edit(e)
 
+# ──────────────────────────────────────────────
+#  Register handlers on bot (always)
+# ──────────────────────────────────────────────
 
-@bot.on(events.MessageDeleted())
-async def handle_message_delete_bot(e):
-    await _on_message_delete(e)
+@bot.on(events.Raw(types=_ROUTED_UPDATES))
+async def handle_update_bot(update):
+    await _route_update("bot", bot, update, incoming_only=True)
 
 
 # ──────────────────────────────────────────────
@@ -349,14 +734,6 @@ async def handle_message_delete_bot(e):
 # ──────────────────────────────────────────────
 
 if userbot:
-    @userbot.on(events.NewMessage())  # No incoming=True — channels post as "out"
-    async def handle_new_message_userbot(e):
-        await _on_new_message(e)
-
-    @userbot.on(events.MessageEdited())
-    async def handle_message_edit_userbot(e):
-        await _on_message_edit(e)
-
-    @userbot.on(events.MessageDeleted())
-    async def handle_message_delete_userbot(e):
-        await _on_message_delete(e)
+    @userbot.on(events.Raw(types=_ROUTED_UPDATES))  # Channels post as "out" for the owner
+    async def handle_update_userbot(update):
+        await _route_update("userbot", userbot, update, incoming_only=False)
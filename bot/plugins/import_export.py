@@ -0,0 +1,237 @@
+import io
+import json
+import time
+
+from . import CACHE, LOGS, Var, bot, events
+from .add_work import cycle_message, validate_channels
+from .database.addwork_db import SETTING_CHOICES, TASK_SETTINGS, get_all_work_names, import_works
+from .utils.routing import RoutingCycleError, check_routes
+
+try:
+    import yaml
+except ImportError:  # YAML is optional; JSON always works
+    yaml = None
+
+EXPORT_VERSION = 1
+# Largest task file /import accepts
+_MAX_IMPORT_BYTES = 5 * 1024 * 1024
+# Diff lines shown before the preview is truncated
+_PREVIEW_LINES = 40
+
+
+def _export_task(task: dict) -> dict:
+    data = {
+        "work_name": task["work_name"],
+        "source": task.get("source", []),
+        "target": task.get("target", []),
+    }
+    for field, default in TASK_SETTINGS.items():
+        data[field] = task.get(field, default)
+    return data
+
+
+def _parse(raw: bytes, filename: str) -> object:
+    if filename.lower().endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ValueError("YAML files need PyYAML installed; send JSON instead")
+        return yaml.safe_load(raw)
+    return json.loads(raw)
+
+
+def _validate(document) -> tuple[list[dict], list[str]]:
+    """Return (normalized tasks, errors) for an export document."""
+    tasks = document.get("tasks") if isinstance(document, dict) else document
+    if not isinstance(tasks, list):
+        return [], ["The file must contain a \"tasks\" list"]
+
+    normalized, errors, seen = [], [], set()
+    for i, entry in enumerate(tasks, start=1):
+        if not isinstance(entry, dict):
+            errors.append(f"#{i}: not an object")
+            continue
+        name = entry.get("work_name")
+        label = f"#{i} ({name})" if name else f"#{i}"
+        if not isinstance(name, str) or not name.strip():
+            errors.append(f"{label}: missing work_name")
+            continue
+        if name.startswith("__"):
+            errors.append(f"{label}: names starting with __ are reserved")
+            continue
+        if name in seen:
+            errors.append(f"{label}: duplicate work_name")
+            continue
+        seen.add(name)
+
+        task = {"work_name": name}
+        for field in ("source", "target"):
+            chats = entry.get(field)
+            if not isinstance(chats, list) or not chats or not all(isinstance(c, int) for c in chats):
+                errors.append(f"{label}: {field} must be a non-empty list of chat IDs")
+                break
+            task[field] = chats
+        else:
+            for field, default in TASK_SETTINGS.items():
+                value = entry.get(field, default)
+                if isinstance(default, bool):
+                    ok = isinstance(value, bool)
+                elif isinstance(default, str):
+                    ok = isinstance(value, str) and value in SETTING_CHOICES.get(field, (value,))
+                elif isinstance(default, int):
+                    ok = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+                else:
+                    ok = isinstance(value, list) and all(isinstance(w, str) for w in value)
+                if not ok:
+                    errors.append(f"{label}: invalid {field}")
+                    break
+                task[field] = value
+            else:
+                normalized.append(task)
+    return normalized, errors
+
+
+def _diff(tasks: list[dict]) -> tuple[list[str], int, int, int]:
+    """Return (preview lines, creates, updates, unchanged) against the current tasks."""
+    lines, creates, updates, unchanged = [], 0, 0, 0
+    for task in tasks:
+        current = CACHE.get(task["work_name"])
+        if not current:
+            creates += 1
+            lines.append(
+                f"➕ {task['work_name']} ({len(task['source'])} sources → {len(task['target'])} targets)"
+            )
+            continue
+        changed = [field for field, value in task.items() if current.get(field) != value]
+        if changed:
+            updates += 1
+            lines.append(f"✏️ {task['work_name']}: {', '.join(changed)}")
+        else:
+            unchanged += 1
+    return lines, creates, updates, unchanged
+
+
+# ──────────────────────────────────────────────
+#  Export
+# ──────────────────────────────────────────────
+
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/export(?: (json|yaml))?$"))
+async def handle_export(e):
+    if e.sender_id not in Var.ADMINS:
+        return
+    names = sorted(await get_all_work_names(), key=str.lower)
+    if not names:
+        return await e.reply("📦 **Export**\n\nNo tasks found.")
+
+    document = {
+        "version": EXPORT_VERSION,
+        "exported": int(time.time()),
+        "tasks": [_export_task(CACHE[name]) for name in names],
+    }
+    fmt = e.pattern_match.group(1) or "json"
+    if fmt == "yaml" and yaml is None:
+        await e.reply("⚠️ PyYAML is not installed, exporting as JSON instead.")
+        fmt = "json"
+    if fmt == "yaml":
+        payload = yaml.safe_dump(document, allow_unicode=True, sort_keys=False)
+    else:
+        payload = json.dumps(document, indent=2, ensure_ascii=False)
+
+    file = io.BytesIO(payload.encode())
+    file.name = f"tasks-{time.strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    await e.client.send_file(
+        e.chat_id, file, force_document=True, reply_to=e.id,
+        caption=f"📦 **Export** : {len(names)} tasks",
+    )
+
+
+# ──────────────────────────────────────────────
+#  Import
+# ──────────────────────────────────────────────
+
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/import$"))
+async def handle_import(e):
+    if e.sender_id not in Var.ADMINS:
+        return
+    try:
+        async with bot.conversation(e.sender_id, timeout=600) as conv:
+            message = e.message if e.document else None
+            if message is None:
+                await conv.send_message(
+                    "📥 **Import Tasks**\n\n"
+                    "Send the task file (.json, or .yaml with PyYAML installed)\n"
+                    "in the format produced by /export.\n\n"
+                    "Send /cancel to abort."
+                )
+                while True:
+                    response = await conv.get_response()
+                    if (response.text or "").startswith("/cancel"):
+                        return await conv.send_message("❌ Process aborted!")
+                    if response.document:
+                        message = response
+                        break
+                    await conv.send_message("⚠️ Please send the task file as a document, or /cancel.")
+
+            if message.document.size > _MAX_IMPORT_BYTES:
+                return await conv.send_message("⚠️ **Import Failed**\n\nThe file is larger than 5 MB.")
+            try:
+                raw = await message.download_media(bytes)
+                tasks, errors = _validate(_parse(raw, message.file.name or ""))
+            except Exception as exc:
+                return await conv.send_message(f"⚠️ **Import Failed**\n\nCould not read the file: {exc}")
+            if errors:
+                shown = "\n".join(f"  • {err}" for err in errors[:20])
+                more = f"\n  … and {len(errors) - 20} more" if len(errors) > 20 else ""
+                return await conv.send_message(f"⚠️ **Import Failed**\n\n{shown}{more}")
+            if not tasks:
+                return await conv.send_message("⚠️ **Import Failed**\n\nThe file contains no tasks.")
+
+            # Every chat must be reachable before anything is written
+            chats = list(dict.fromkeys(c for task in tasks for c in task["source"] + task["target"]))
+            if await validate_channels(conv, [str(c) for c in chats]) is None:
+                return await conv.send_message("❌ Import aborted. Fix the file and send /import again.")
+
+            try:
+                check_routes({t["work_name"]: {**CACHE.get(t["work_name"], {}), **t} for t in tasks})
+            except RoutingCycleError as exc:
+                return await conv.send_message(await cycle_message(exc) + "\n\nNothing was imported.")
+
+            lines, creates, updates, unchanged = _diff(tasks)
+            if not creates and not updates:
+                return await conv.send_message("✅ **Import**\n\nAll tasks are already up to date.")
+            preview = "\n".join(lines[:_PREVIEW_LINES])
+            if len(lines) > _PREVIEW_LINES:
+                preview += f"\n… and {len(lines) - _PREVIEW_LINES} more"
+            await conv.send_message(
+                "📋 **Import Preview (dry run)**\n\n"
+                f"**Create** : {creates}\n"
+                f"**Update** : {updates}\n"
+                f"**Unchanged** : {unchanged}\n\n"
+                f"{preview}\n\n"
+                "Send /apply to apply these changes or /cancel to abort."
+            )
+            while True:
+                response = await conv.get_response()
+                text = response.text or ""
+                if text.startswith("/cancel"):
+                    return await conv.send_message("❌ Process aborted!")
+                if text.startswith("/apply"):
+                    break
+                await conv.send_message("Send /apply or /cancel.")
+
+            changed = [
+                task for task in tasks
+                if CACHE.get(task["work_name"]) is None
+                or any(CACHE[task["work_name"]].get(f) != v for f, v in task.items())
+            ]
+            try:
+                await import_works(changed)
+            except Exception as exc:
+                LOGS.error("Task import failed: %s", exc)
+                return await conv.send_message(f"⚠️ **Import Failed**\n\nNothing was changed: {exc}")
+            await conv.send_message(
+                "✅ **Import Complete**\n\n"
+                f"**Created** : {creates}\n"
+                f"**Updated** : {updates}\n\n"
+                "Use /tasks to review them."
+            )
+    except TimeoutError:
+        LOGS.info("Import conversation timed out for user %s", e.sender_id)
@@ -1,8 +1,17 @@
+import io
+import time
+
 from . import (
     CACHE, Button, FORWARD_MODE_KEY, Var,
-    bot, events, re, set_forward_mode, userbot,
+    bot, events, re, set_forward_mode,
 )
 from .database.addwork_db import get_all_work_names
+from .database.stats_db import read_stats
+from .forwarder import HEALTH, LISTENERS
+from .utils.pool import POOL
+from .utils.profiler import ProfileBusy, profile_loop
+from .utils.tracing import slowest_traces
+from .utils.watchdog import WATCHDOG
 
 START_TEXT = (
     "🚀 **Auto Forward Bot**\n\n"
@@ -17,9 +26,14 @@ HELP_TEXT = (
     "💎 **Command Panel**\n\n"
     "/add_task  – Add a new forwarding task\n"
     "/tasks     – Manage existing tasks\n"
+    "/search    – Find tasks by name prefix\n"
+    "/export    – Download all tasks as JSON or YAML\n"
+    "/import    – Create or update tasks from a file\n"
     "/mode      – Switch forwarding client\n"
     "/status    – View system status\n"
-    "/stats     – View forwarding statistics\n\n"
+    "/stats     – View forwarding statistics\n"
+    "/traces    – Slowest recent message traces\n"
+    "/profile   – Profile the bot for N seconds\n\n"
     "Use commands carefully."
 )
 
@@ -58,7 +72,7 @@ async def handle_help(e):
 # ──────────────────────────────────────────────
 
 def _mode_text(current_mode: str) -> str:
-    ub_available = "Yes" if userbot else "No"
+    ub_available = "Yes" if POOL.members("userbot") else "No"
     return (
         "**Forwarding Mode**\n\n"
         f"**Current** : {current_mode.capitalize()}\n"
@@ -103,7 +117,7 @@ async def handle_set_mode(e):
 
     requested_mode = e.pattern_match.group(1).decode("utf-8")
 
-    if requested_mode == "userbot" and not userbot:
+    if requested_mode == "userbot" and not POOL.members("userbot"):
         return await e.answer(
             "Userbot unavailable. Set SESSION_STRING in .env and restart.",
             alert=True,
@@ -129,7 +143,28 @@ async def handle_status(e):
     active = sum(1 for name in work_names if CACHE.get(name, {}).get("has_to_forward"))
     stopped = total - active
     current_mode = CACHE.get(FORWARD_MODE_KEY, "bot")
-    ub_status = "Connected" if userbot else "Not configured"
+    ub_status = "Connected" if POOL.get("userbot") else "Not configured"
+    listeners = " │ ".join(f"{name} {count}" for name, count in LISTENERS.counts().items())
+    pool = " │ ".join(
+        f"{m.name} ({m.sent} sent, {m.flood_waits} floods)" for m in POOL.members()
+    )
+
+    failovers = HEALTH.failovers()
+    failover_lines = [
+        f"  • {chat} → {name} (score {HEALTH.score(name, chat):.2f})"
+        for chat, name in list(failovers.items())[:10]
+    ]
+    degraded_lines = [
+        f"  • {name} → {chat}: {score:.2f}" for name, chat, score in HEALTH.lowest()
+    ]
+    switch_lines = [
+        f"  • {chat}: {old} → {new} (score {score})"
+        for _, chat, old, new, score in list(HEALTH.switches)[-5:]
+    ]
+    stall_lines = [
+        f"  • {time.strftime('%H:%M:%S', time.localtime(ts))} {lag * 1000:.0f} ms at {origin}"
+        for ts, lag, origin in list(WATCHDOG.stalls)[-3:]
+    ]
 
     txt = (
         "📊 **System Status**\n\n"
@@ -138,8 +173,21 @@ async def handle_status(e):
         f"**Stopped** : {stopped}\n"
         f"**Forward Mode** : {current_mode.capitalize()}\n"
         f"**Userbot** : {ub_status}\n"
-        f"**Bot** : Online"
+        f"**Bot** : Online\n"
+        f"**Listeners** : {listeners} (handovers: {LISTENERS.handovers})\n"
+        f"**Pool** : {pool}\n"
+        f"**Failovers** : {len(failovers)} active, {HEALTH.switch_count} switches\n"
+        f"**Loop Lag** : {WATCHDOG.lag * 1000:.0f} ms (peak {WATCHDOG.peak * 1000:.0f} ms, "
+        f"{len(WATCHDOG.stalls)} recent stalls)"
     )
+    if failover_lines:
+        txt += "\n\n**Failed-over Targets:**\n" + "\n".join(failover_lines)
+    if degraded_lines:
+        txt += "\n\n**Degraded Scores:**\n" + "\n".join(degraded_lines)
+    if switch_lines:
+        txt += "\n\n**Recent Switches:**\n" + "\n".join(switch_lines)
+    if stall_lines:
+        txt += "\n\n**Recent Loop Stalls:**\n" + "\n".join(stall_lines)
     await e.reply(txt)
 
 
@@ -151,17 +199,91 @@ async def handle_stats(e):
     if not work_names:
         return await e.reply("📈 **Forwarding Statistics**\n\nNo tasks found.")
 
+    totals, last_hour, last_day = await read_stats()
     lines = []
     for name in work_names:
         task = CACHE.get(name, {})
         status = "🟢" if task.get("has_to_forward") else "🔴"
         sources = len(task.get("source", []))
         targets = len(task.get("target", []))
-        forwarded = sum(len(msgs) for msgs in task.get("crossids", {}).values())
+        total = totals.get(name, {})
+        hour = last_hour.get(name, {})
+        day = last_day.get(name, {})
+        day_sent = day.get("forwarded", 0)
+        day_failed = day.get("failed", 0)
+        failure_rate = day_failed / (day_sent + day_failed) * 100 if day_sent + day_failed else 0.0
         lines.append(
             f"{status} **{name}**\n"
-            f"    Sources: {sources} │ Targets: {targets} │ Forwarded: {forwarded}"
+            f"    Sources: {sources} │ Targets: {targets}\n"
+            f"    Forwarded: {total.get('forwarded', 0)} │ Last hour: {hour.get('forwarded', 0)}"
+            f" │ Last day: {day_sent}\n"
+            f"    Edits: {total.get('edited', 0)} │ Deletes: {total.get('deleted', 0)}"
+            f" │ Failure rate (24h): {failure_rate:.1f}%"
         )
+        if total.get("deduped"):
+            lines[-1] += f"\n    Duplicates skipped: {total['deduped']} │ Last day: {day.get('deduped', 0)}"
 
     txt = "📈 **Forwarding Statistics**\n\n" + "\n\n".join(lines)
     await e.reply(txt)
+
+
+_MAX_MESSAGE_LENGTH = 4096
+
+
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/traces(?: (\d+))?$"))
+async def handle_traces(e):
+    if e.sender_id not in Var.ADMINS:
+        return
+    if Var.TRACE_SAMPLE_RATE <= 0:
+        return await e.reply("🔍 **Message Traces**\n\nTracing is disabled. Set `TRACE_SAMPLE_RATE` to enable it.")
+    limit = min(int(e.pattern_match.group(1) or 5), 20)
+    traces = slowest_traces(limit)
+    if not traces:
+        return await e.reply("🔍 **Message Traces**\n\nNo traces recorded yet.")
+
+    blocks, plain = [], []
+    for trace in traces:
+        meta = f"{trace.chat}/{trace.msg_id} │ {trace.total_ms:.0f} ms"
+        stages = "\n".join(
+            f"    {ms:>9.1f} ms  {stage}" + (f" → {target}" if target is not None else "")
+            for stage, ms, target in trace.stages
+        )
+        blocks.append(f"**{trace.task}** │ {meta}\n```\n{stages}\n```")
+        plain.append(f"{trace.task} │ {meta}\n{stages}")
+    text = "🔍 **Slowest Message Traces**\n\n" + "\n\n".join(blocks)
+    if len(text) <= _MAX_MESSAGE_LENGTH:
+        return await e.reply(text)
+
+    # Fan-out traces outgrow a single message; send the full report as a file
+    report_file = io.BytesIO("\n\n".join(plain).encode())
+    report_file.name = f"traces-{time.strftime('%Y%m%d-%H%M%S')}.txt"
+    await e.client.send_file(
+        e.chat_id, report_file, force_document=True, reply_to=e.id,
+        caption=f"🔍 Slowest {len(traces)} message traces",
+    )
+
+
+_PROFILE_MAX_SECONDS = 300
+
+
+@bot.on(events.NewMessage(incoming=True, pattern=r"^/profile(?: (\d+))?$"))
+async def handle_profile(e):
+    if e.sender_id not in Var.ADMINS:
+        return
+    seconds = min(max(int(e.pattern_match.group(1) or 30), 1), _PROFILE_MAX_SECONDS)
+    status = await e.reply(f"⏱ **Profiling**\n\nRecording the event loop for {seconds}s…")
+    try:
+        report, stacks = await profile_loop(seconds)
+    except ProfileBusy:
+        return await status.edit("⚠️ **Profiling**\n\nA profiling session is already running.")
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    report_file = io.BytesIO(report.encode())
+    report_file.name = f"profile-{stamp}.txt"
+    stacks_file = io.BytesIO(stacks.encode())
+    stacks_file.name = f"profile-{stamp}.folded"
+    await status.delete()
+    await e.client.send_file(
+        e.chat_id, [report_file, stacks_file], force_document=True, reply_to=e.id,
+        caption=[f"⏱ Profile of the last {seconds}s", "Folded stacks (flamegraph.pl / speedscope)"],
+    )
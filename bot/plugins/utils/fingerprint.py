@@ -0,0 +1,101 @@
+import hashlib
+import math
+import re
+import time
+
+from telethon.tl import types
+
+from bot import Var
+
+# Whitespace and case differences between reposts of the same post are ignored
+_SPACES = re.compile(r"\s+")
+_DIGEST_SIZE = 16
+
+
+def fingerprint(message) -> bytes | None:
+    """
+    Content fingerprint of a message: normalized text plus the media's unique ID.
+
+    Reposts forwarded or re-shared between channels keep their photo or
+    document ID, so the same post read from several sources maps to one
+    fingerprint. Returns None for messages with nothing to compare.
+    """
+    text = _SPACES.sub(" ", (message.message or "").casefold()).strip()
+    media = message.media
+    if isinstance(media, types.MessageMediaPhoto) and media.photo:
+        media_id = f"p{media.photo.id}"
+    elif isinstance(media, types.MessageMediaDocument) and media.document:
+        media_id = f"d{media.document.id}"
+    elif media is None or isinstance(media, (types.MessageMediaWebPage, types.MessageMediaEmpty)):
+        media_id = ""
+    else:
+        # Polls, locations and the like have no stable ID to compare
+        return None
+    if not text and not media_id:
+        return None
+    return hashlib.blake2b(f"{media_id}\0{text}".encode(), digest_size=_DIGEST_SIZE).digest()
+
+
+class RotatingBloom:
+    """
+    Time-windowed set of recently seen keys in fixed memory.
+
+    Two Bloom filters take turns: keys go into the current one, lookups
+    check both, and every half window the older one is wiped and becomes
+    current. A key is therefore remembered for between one half and one
+    full window. False positives stay below `error` while at most
+    `capacity` keys arrive per half window; there are no false negatives.
+    """
+
+    __slots__ = ("window", "bits", "hashes", "_filters", "_rotated")
+
+    def __init__(self, window: float, capacity: int, error: float = 0.001):
+        self.window = window
+        self.bits = max(64, int(-capacity * math.log(error) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self._filters = [bytearray((self.bits + 7) // 8), bytearray((self.bits + 7) // 8)]
+        self._rotated = time.monotonic()
+
+    def _positions(self, key: bytes) -> list[int]:
+        # Kirsch–Mitzenmacher: k positions from two 64-bit hashes
+        digest = hashlib.blake2b(key, digest_size=_DIGEST_SIZE).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def _rotate(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._rotated
+        if elapsed < self.window / 2:
+            return
+        if elapsed >= self.window:
+            # Idle for a full window: nothing in either filter is recent any more
+            self._filters[1][:] = bytes(len(self._filters[1]))
+        self._filters.reverse()
+        self._filters[0][:] = bytes(len(self._filters[0]))
+        self._rotated = now
+
+    def __contains__(self, key: bytes) -> bool:
+        """Whether `key` was added within the window (or is a false positive)."""
+        self._rotate()
+        positions = self._positions(key)
+        return any(all(bits[p >> 3] & (1 << (p & 7)) for p in positions) for bits in self._filters)
+
+    def add(self, key: bytes) -> None:
+        self._rotate()
+        current = self._filters[0]
+        for p in self._positions(key):
+            current[p >> 3] |= 1 << (p & 7)
+
+    def clear(self) -> None:
+        for bits in self._filters:
+            bits[:] = bytes(len(bits))
+        self._rotated = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(bits) for bits in self._filters)
+
+
+# Content already sent to a target chat by a task with dedup_content on
+SEEN = RotatingBloom(Var.DEDUP_WINDOW, Var.DEDUP_CAPACITY)
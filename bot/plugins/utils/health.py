@@ -0,0 +1,104 @@
+import time
+from collections import deque
+
+from bot import LOGS
+
+# Error rate / latency penalties fade with this half-life so a degraded
+# client is retried (and failed back to) once it has had time to recover.
+_HALF_LIFE = 120  # seconds
+_ERROR_ALPHA = 0.3
+_LATENCY_ALPHA = 0.2
+_LATENCY_OK = 1.0  # seconds; slower sends start lowering the score
+_DEGRADED = 0.5
+_RECOVERED = 0.8
+
+
+class HealthStat:
+    """Recent error rate, FloodWait and latency of one client towards one target."""
+
+    __slots__ = ("errors", "latency", "flood_until", "stamp")
+
+    def __init__(self):
+        self.errors = 0.0
+        self.latency = 0.0
+        self.flood_until = 0.0
+        self.stamp = time.monotonic()
+
+    def _decay(self, now: float) -> float:
+        return 0.5 ** ((now - self.stamp) / _HALF_LIFE)
+
+    def record(self, ok: bool, latency: float, flood: int) -> None:
+        now = time.monotonic()
+        factor = self._decay(now)
+        self.errors = self.errors * factor * (1 - _ERROR_ALPHA) + (0.0 if ok else _ERROR_ALPHA)
+        if ok:
+            self.latency = self.latency * factor * (1 - _LATENCY_ALPHA) + latency * _LATENCY_ALPHA
+        if flood:
+            self.flood_until = max(self.flood_until, now + flood)
+        self.stamp = now
+
+    def score(self, now: float) -> float:
+        if now < self.flood_until:
+            return 0.0
+        factor = self._decay(now)
+        slowness = max(0.0, self.latency * factor - _LATENCY_OK)
+        return (1.0 - self.errors * factor) / (1.0 + slowness / 5.0)
+
+
+class HealthBoard:
+    """
+    Per-target health scores for every pool member, plus failover state.
+
+    `choose` keeps sending through the preferred member until its score
+    drops below _DEGRADED and the alternate is healthier, then fails over.
+    It fails back once the preferred member scores above _RECOVERED again.
+    """
+
+    def __init__(self):
+        self._stats: dict[tuple[str, int], HealthStat] = {}
+        self._failed_over: dict[int, str] = {}  # chat -> name of the member in use instead
+        self.switches: deque = deque(maxlen=20)
+        self.switch_count = 0
+
+    def record(self, name: str, chat: int, ok: bool, latency: float = 0.0, flood: int = 0) -> None:
+        stat = self._stats.get((name, chat))
+        if stat is None:
+            stat = self._stats[(name, chat)] = HealthStat()
+        stat.record(ok, latency, flood)
+
+    def score(self, name: str, chat: int) -> float:
+        stat = self._stats.get((name, chat))
+        return stat.score(time.monotonic()) if stat else 1.0
+
+    def choose(self, chat: int, preferred, alternate):
+        """Return `preferred` or `alternate` depending on their health for `chat`."""
+        if alternate is None:
+            return preferred
+        pref_score = self.score(preferred.name, chat)
+        if chat in self._failed_over:
+            if pref_score >= _RECOVERED:
+                self._switch(chat, alternate.name, preferred.name, pref_score)
+                del self._failed_over[chat]
+                return preferred
+            return alternate
+        if pref_score < _DEGRADED and self.score(alternate.name, chat) > pref_score:
+            self._switch(chat, preferred.name, alternate.name, pref_score)
+            self._failed_over[chat] = alternate.name
+            return alternate
+        return preferred
+
+    def _switch(self, chat: int, old: str, new: str, pref_score: float) -> None:
+        self.switch_count += 1
+        self.switches.append((int(time.time()), chat, old, new, round(pref_score, 2)))
+        LOGS.info("Target %s switched from %s to %s (preferred score %.2f)", chat, old, new, pref_score)
+
+    def failovers(self) -> dict[int, str]:
+        """Targets currently served by their alternate member."""
+        return dict(self._failed_over)
+
+    def lowest(self, limit: int = 5) -> list[tuple[str, int, float]]:
+        """(member, chat, score) for the worst-scoring pairs below the degraded mark."""
+        now = time.monotonic()
+        scored = [(name, chat, stat.score(now)) for (name, chat), stat in self._stats.items()]
+        degraded = [row for row in scored if row[2] < _DEGRADED]
+        return sorted(degraded, key=lambda row: row[2])[:limit]
@@ -0,0 +1,85 @@
+import time
+
+from bot import LOGS
+
+# A non-listener must keep seeing a source alone for this long before it takes over
+_HANDOVER_GRACE = 30  # seconds
+_HANDOVER_MIN_MISSES = 2
+
+
+class ListenerTable:
+    """
+    Decide, per source chat, which client is the single listener.
+
+    Both clients receive updates from chats they share. The first healthy
+    client to deliver an update from a source becomes its listener; the
+    other client's copies of updates the listener already delivered are
+    dropped before any processing. Updates only the other client has seen
+    (listener kicked, bot privacy mode) are always let through. The
+    listener is handed over when it disconnects, or when the other client
+    keeps receiving the source while the listener has gone quiet.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, object] = {}
+        self._assigned: dict[int, str] = {}
+        # source -> (first_miss_ts, count): updates only a non-listener has seen
+        self._misses: dict[int, tuple[float, int]] = {}
+        self.handovers = 0
+
+    def register(self, name: str, client) -> None:
+        self._clients[name] = client
+
+    def _healthy(self, name: str) -> bool:
+        client = self._clients.get(name)
+        return client is not None and client.is_connected()
+
+    def accept(self, name: str, chat_id: int, duplicate: bool = False) -> bool:
+        """
+        Return True if the update from `name` for `chat_id` should be processed.
+
+        `duplicate` tells whether the same update was already processed
+        (from either client); such copies are dropped whoever delivers
+        them, so a shared update is decoded once even when the other
+        client wins the race.
+        """
+        owner = self._assigned.get(chat_id)
+        if owner == name:
+            if chat_id in self._misses:
+                del self._misses[chat_id]
+            return not duplicate
+        if owner is None:
+            self._assigned[chat_id] = name
+            return not duplicate
+        if not self._healthy(owner):
+            self._handover(chat_id, owner, name, "disconnected")
+            return not duplicate
+
+        if duplicate:
+            # The listener delivered this one too, so it is still receiving the source
+            self._misses.pop(chat_id, None)
+            return False
+
+        # Only this client has seen the update so far: process it, and take
+        # over if that keeps happening
+        now = time.monotonic()
+        first, count = self._misses.get(chat_id, (now, 0))
+        count += 1
+        if count >= _HANDOVER_MIN_MISSES and now - first > _HANDOVER_GRACE:
+            self._handover(chat_id, owner, name, "not receiving")
+        else:
+            self._misses[chat_id] = (first, count)
+        return True
+
+    def _handover(self, chat_id: int, old: str, new: str, reason: str) -> None:
+        self._assigned[chat_id] = new
+        self._misses.pop(chat_id, None)
+        self.handovers += 1
+        LOGS.info("Listener for %s handed over from %s to %s (%s)", chat_id, old, new, reason)
+
+    def counts(self) -> dict[str, int]:
+        """Number of sources each client currently listens to."""
+        result = {name: 0 for name in self._clients}
+        for name in self._assigned.values():
+            result[name] = result.get(name, 0) + 1
+        return result
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from telethon import utils
+from telethon.tl import types
+
+from .pool import ACCESS_ERRORS
+
+# Source messages whose InputMedia is kept, per sending account
+_CACHE_SIZE = 512
+# File references expire after a while; entries older than this are rebuilt up front
+_REFERENCE_TTL = 3600  # seconds
+
+# Media that can be re-sent by reference; anything else is forwarded without the header
+_COPYABLE = (
+    types.MessageMediaPhoto,
+    types.MessageMediaDocument,
+    types.MessageMediaGeo,
+    types.MessageMediaGeoLive,
+    types.MessageMediaVenue,
+    types.MessageMediaContact,
+    types.MessageMediaDice,
+)
+# Media that is implied by the text (link previews) and needs no file at all
+_TEXT_ONLY = (types.MessageMediaWebPage, types.MessageMediaEmpty)
+
+
+class SourceUnavailableError(Exception):
+    """The sending account cannot see the message whose media it should reuse."""
+
+
+def copyable(message) -> bool:
+    """Whether a message can be sent as a new message (text, or media reusable by reference)."""
+    return message.media is None or isinstance(message.media, _COPYABLE + _TEXT_ONLY)
+
+
+class MediaCache:
+    """
+    InputMedia for copied messages, built once per (account, source message).
+
+    Photos and documents carry an access hash and file reference that
+    belong to the account that fetched them, so entries are per account.
+    The first target to need one builds it; concurrent targets await the
+    same future, so a message sent to N targets is never uploaded at all
+    and fetched at most once per account.
+    """
+
+    __slots__ = ("size", "_entries")
+
+    def __init__(self, size: int = _CACHE_SIZE):
+        self.size = size
+        self._entries: OrderedDict[tuple, tuple[float, asyncio.Future]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, client, message, chat_id: int, refresh: bool = False, msg_id: int | None = None):
+        """
+        Return InputMedia for `message` usable by `client`, or None if it has no file.
+
+        `message` is the copy delivered to the listening account; another
+        account gets its own copy through get_messages. `msg_id` reads the
+        media from another message with the same content in `chat_id`
+        (a chained task's copy) instead. `refresh` drops the cached entry,
+        for retrying after FileReferenceExpiredError.
+        """
+        if message.media is None or isinstance(message.media, _TEXT_ONLY):
+            return None
+        relayed = msg_id is not None
+        msg_id = message.id if msg_id is None else msg_id
+        key = (id(client), chat_id, msg_id)
+        entry = self._entries.get(key)
+        if entry and (refresh or time.monotonic() - entry[0] > _REFERENCE_TTL):
+            if entry[1].done():
+                del self._entries[key]
+                entry = None
+        if entry is None:
+            future = asyncio.ensure_future(self._build(client, message, chat_id, msg_id, refetch=refresh or relayed))
+            entry = (time.monotonic(), future)
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        try:
+            return await asyncio.shield(entry[1])
+        except Exception:
+            # Failed builds are not cached; the next target tries again
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+            raise
+
+    @staticmethod
+    async def _build(client, message, chat_id: int, msg_id: int, refetch: bool):
+        if refetch or getattr(message, "client", None) is not client:
+            try:
+                fresh = await client.get_messages(chat_id, ids=msg_id)
+            except ACCESS_ERRORS as exc:
+                raise SourceUnavailableError(f"chat {chat_id} is not readable by this account: {exc}") from exc
+            if fresh is None:
+                raise SourceUnavailableError(f"message {msg_id} in {chat_id} is not visible to this account")
+            message = fresh
+        return utils.get_input_media(message.media)
+
+
+MEDIA = MediaCache()
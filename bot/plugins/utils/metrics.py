@@ -0,0 +1,157 @@
+import asyncio
+from bisect import bisect_left
+
+from bot import LOGS
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values (a dict increment per call)."""
+
+    __slots__ = ("name", "help", "labelnames", "values")
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in self.values.items():
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time (zero hot-path cost)."""
+
+    __slots__ = ("name", "help", "func")
+
+    def __init__(self, name: str, help_text: str, func):
+        self.name = name
+        self.help = help_text
+        self.func = func
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {self.func()}")
+        except Exception as e:
+            LOGS.debug("Gauge %s failed: %s", self.name, e)
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect plus a list increment."""
+
+    __slots__ = ("name", "help", "labelnames", "buckets", "series")
+
+    def __init__(self, name: str, help_text: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        row = self.series.get(labels)
+        if row is None:
+            row = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, row in self.series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), row[:-1]):
+                cumulative += count
+                le = _labels((*self.labelnames, "le"), (*labels, bound))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{base} {row[-1]}")
+            lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+# ──────────────────────────────────────────────
+#  Forwarder metrics
+# ──────────────────────────────────────────────
+
+EVENTS = Counter("forwarder_events_total", "Updates from source chats by client and kind", ("client", "kind"))
+FORWARDS = Counter("forwarder_forwards_total", "Messages delivered per task and target", ("task", "target"))
+EDITS = Counter("forwarder_edits_total", "Edits propagated per task and target", ("task", "target"))
+DELETES = Counter("forwarder_deletes_total", "Deletes propagated per task and target", ("task", "target"))
+FAILURES = Counter("forwarder_failures_total", "Failed API calls by action and exception type", ("action", "error"))
+FLOOD_SECONDS = Counter("forwarder_floodwait_seconds_total", "FloodWait seconds imposed per pool member", ("member",))
+DEDUP_HITS = Counter("forwarder_dedup_hits_total", "Updates skipped as duplicates", ("kind",))
+CROSSID_LOOKUPS = Counter(
+    "forwarder_crossid_lookups_total", "Forwarded-copy lookups answered from memory (hit) or Redis (miss)", ("result",)
+)
+DELIVERY_LATENCY = Histogram(
+    "forwarder_delivery_latency_seconds",
+    "Source message date to successful delivery",
+    (0.25, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+
+REGISTRY: list = [
+    EVENTS, FORWARDS, EDITS, DELETES, FAILURES, FLOOD_SECONDS, DEDUP_HITS, CROSSID_LOOKUPS, DELIVERY_LATENCY,
+]
+
+
+def register_gauge(name: str, help_text: str, func) -> None:
+    """Expose a queue depth or size computed on scrape."""
+    REGISTRY.append(Gauge(name, help_text, func))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_request(reader, writer) -> None:
+    try:
+        request_line = await reader.readline()
+        # Drain headers; only GET /metrics is served
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            body = render_metrics().encode()
+            status = b"200 OK"
+        else:
+            body, status = b"Not Found\n", b"404 Not Found"
+        writer.write(
+            b"HTTP/1.1 " + status + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except Exception as e:
+        LOGS.debug("Metrics request failed: %s", e)
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int) -> None:
+    """Serve Prometheus text metrics on the shared event loop."""
+    server = await asyncio.start_server(_handle_request, host, port)
+    LOGS.info("Metrics endpoint listening on http://%s:%d/metrics", host, port)
+    asyncio.ensure_future(server.serve_forever())
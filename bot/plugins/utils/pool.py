@@ -0,0 +1,255 @@
+import asyncio
+import time
+
+from telethon.errors import (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    ChatAdminRequiredError,
+    ChatWriteForbiddenError,
+    PeerIdInvalidError,
+    UserBannedInChannelError,
+)
+
+from bot import EXTRA_CLIENTS, LOGS, Var, bot, userbot
+from .metrics import register_gauge
+
+# Send lanes; lower values are more urgent
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+# Relative share of the send rate each lane gets while several are waiting
+_WEIGHTS = {0: 6, 1: 3, 2: 1}
+# Share of each account's burst budget that lower lanes leave untouched for the lanes above
+_RESERVE = {0: 0.0, 1: Var.PRIORITY_RESERVE, 2: 2 * Var.PRIORITY_RESERVE}
+
+
+class UnknownChatError(Exception):
+    """A chat is not in the sending account's entity cache."""
+
+
+async def input_peer(client, chat: int):
+    """
+    get_input_entity for a send; a cache miss raises UnknownChatError.
+
+    Telethon reports the miss as a plain ValueError, which would be
+    indistinguishable from unrelated bugs in the send path.
+    """
+    try:
+        return await client.get_input_entity(chat)
+    except ValueError as exc:
+        raise UnknownChatError(str(exc)) from exc
+
+
+# Errors meaning "this account cannot post in / see that chat" — try another member
+ACCESS_ERRORS = (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    ChatAdminRequiredError,
+    ChatWriteForbiddenError,
+    PeerIdInvalidError,
+    UserBannedInChannelError,
+    UnknownChatError,
+)
+# A member found without access to a chat is retried for it after this long
+_NO_ACCESS_TTL = 3600  # seconds
+
+
+class PoolMember:
+    """
+    One sending account with its own token-bucket rate budget.
+
+    Sends wait in priority lanes served by stride scheduling: while
+    several lanes are waiting, each gets tokens in proportion to its
+    weight (_WEIGHTS), so a busy high lane delays low work but never
+    starves it. A lane alone leaves the reserve kept for the lanes above
+    it untouched; with no urgent traffic every lane still gets the full
+    rate, and urgent traffic that arrives finds tokens ready.
+    """
+
+    __slots__ = (
+        "name", "client", "kind", "rate", "burst", "_tokens", "_stamp", "_waiting", "_pass", "_vtime",
+        "blocked_until", "sent", "flood_waits",
+    )
+
+    def __init__(self, name: str, client, kind: str, rate: float):
+        self.name = name
+        self.client = client
+        self.kind = kind
+        self.rate = rate
+        # The bucket always holds at least one token, so rates below 1/s still send
+        self.burst = max(1.0, rate)
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._waiting = [0] * len(PRIORITIES)
+        # Stride scheduling: a lane's position in virtual time, advanced 1/weight per token
+        self._pass = [0.0] * len(PRIORITIES)
+        self._vtime = 0.0
+        self.blocked_until = 0.0
+        self.sent = 0
+        self.flood_waits = 0
+
+    async def acquire(self, lane: int = PRIORITIES["normal"]) -> None:
+        """Wait until this member may send one more request in `lane` (see PRIORITIES)."""
+        if self.rate <= 0:
+            # Rate limiting disabled; only FloodWait pauses this member
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+            self.sent += 1
+            return
+        # Tokens a lane alone must leave for the lanes above (never more than the bucket holds)
+        reserve_need = max(1.0, min(1 + _RESERVE[lane] * self.burst, self.burst))
+        if not self._waiting[lane]:
+            # A lane that was idle joins at the current virtual time instead of cashing in its idle period
+            self._pass[lane] = max(self._pass[lane], self._vtime)
+        self._waiting[lane] += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                # Competing with a higher lane, this lane's turn needs one token and no reserve
+                need = 1.0 if any(self._waiting[:lane]) else reserve_need
+                if self._turn() == lane and self._tokens >= need:
+                    self._tokens -= 1
+                    self._vtime = self._pass[lane]
+                    self._pass[lane] += 1 / _WEIGHTS[lane]
+                    self.sent += 1
+                    return
+                # Another lane's turn or not enough budget: look again after at least one token's worth of time
+                await asyncio.sleep(max(need - self._tokens, 1) / self.rate)
+        finally:
+            self._waiting[lane] -= 1
+
+    def _turn(self) -> int:
+        """The waiting lane furthest behind in virtual time (ties go to the more urgent lane)."""
+        return min((p, lane) for lane, p in enumerate(self._pass) if self._waiting[lane])[1]
+
+    def waiting(self, lane: int) -> int:
+        """Requests currently waiting for budget in `lane`."""
+        return self._waiting[lane]
+
+    def flood_wait(self, seconds: int) -> None:
+        """Pause this member after Telegram reported a FloodWait."""
+        self.flood_waits += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class ClientPool:
+    """
+    Pool of sending accounts grouped by kind ("bot" / "userbot").
+
+    Each target chat is pinned to one member of a kind, spreading targets
+    evenly so every account's flood limits are used. A member that turns
+    out to have no access to a target is excluded for it and the chat is
+    re-pinned to the next member; one that cannot read a source is
+    skipped for messages from that source only. Both expire after
+    _NO_ACCESS_TTL, so an account added to the chat later is used again.
+    """
+
+    def __init__(self):
+        self._members: dict[str, PoolMember] = {}
+        self._by_kind: dict[str, list[PoolMember]] = {"bot": [], "userbot": []}
+        self._assigned: dict[tuple[str, int], PoolMember] = {}
+        # chat -> {member name: excluded until (monotonic)}
+        self._no_access: dict[int, dict[str, float]] = {}
+        self._no_read: dict[int, dict[str, float]] = {}
+
+    def add(self, name: str, client, kind: str) -> None:
+        rate = Var.BOT_SEND_RATE if kind == "bot" else Var.USER_SEND_RATE
+        member = PoolMember(name, client, kind, rate)
+        self._members[name] = member
+        self._by_kind[kind].append(member)
+
+    def remove(self, name: str) -> None:
+        """Drop a member (e.g. its client failed to start) and release its chats."""
+        member = self._members.pop(name, None)
+        if member is None:
+            return
+        self._by_kind[member.kind].remove(member)
+        for key in [k for k, m in self._assigned.items() if m is member]:
+            del self._assigned[key]
+
+    def get(self, name: str | None) -> PoolMember | None:
+        return self._members.get(name) if name else None
+
+    def members(self, kind: str | None = None) -> list[PoolMember]:
+        if kind is None:
+            return list(self._members.values())
+        return self._by_kind.get(kind, [])
+
+    def for_target(self, kind: str, chat: int) -> PoolMember:
+        """Return the member pinned to `chat` for `kind`, assigning one if needed."""
+        member = self._assigned.get((kind, chat))
+        if member is not None:
+            return member
+        candidates = self._by_kind.get(kind) or self._by_kind["bot"]
+        excluded = self._excluded(self._no_access, chat)
+        usable = [m for m in candidates if m.name not in excluded] or candidates
+        loads: dict[str, int] = {}
+        for assigned in self._assigned.values():
+            loads[assigned.name] = loads.get(assigned.name, 0) + 1
+        member = min(usable, key=lambda m: loads.get(m.name, 0))
+        self._assigned[(kind, chat)] = member
+        return member
+
+    @staticmethod
+    def _excluded(table: dict[int, dict[str, float]], chat: int) -> set[str]:
+        entries = table.get(chat)
+        if not entries:
+            return set()
+        now = time.monotonic()
+        for name in [n for n, until in entries.items() if until <= now]:
+            del entries[name]
+        return set(entries)
+
+    def no_access(self, member: PoolMember, chat: int) -> PoolMember | None:
+        """Exclude `member` for target `chat` and return the replacement, if any."""
+        self._no_access.setdefault(chat, {})[member.name] = time.monotonic() + _NO_ACCESS_TTL
+        excluded = self._excluded(self._no_access, chat)
+        self._assigned.pop((member.kind, chat), None)
+        if all(m.name in excluded for m in self.members(member.kind)):
+            return None
+        replacement = self.for_target(member.kind, chat)
+        LOGS.info("Chat %s moved from %s to %s (no access)", chat, member.name, replacement.name)
+        return replacement
+
+    def cannot_read(self, member: PoolMember, source: int) -> None:
+        """Remember that `member` cannot see `source`; its targets are left alone."""
+        self._no_read.setdefault(source, {})[member.name] = time.monotonic() + _NO_ACCESS_TTL
+
+    def can_read(self, member: PoolMember, source: int) -> bool:
+        return member.name not in self._excluded(self._no_read, source)
+
+    def reader_for(self, chat: int, source: int, skip: set[str], kind: str) -> PoolMember | None:
+        """
+        A member that can read `source` and post in `chat`, for one send.
+
+        Members of `kind` come first; nothing is pinned, so the chat's own
+        member is used again once it can see the source.
+        """
+        unusable = skip | self._excluded(self._no_read, source) | self._excluded(self._no_access, chat)
+        members = sorted(self.members(), key=lambda m: m.kind != kind)
+        return next((m for m in members if m.name not in unusable), None)
+
+    def clear(self) -> None:
+        """Forget every pinned chat and exclusion."""
+        self._assigned.clear()
+        self._no_access.clear()
+        self._no_read.clear()
+
+
+POOL = ClientPool()
+POOL.add("bot", bot, "bot")
+if userbot:
+    POOL.add("userbot", userbot, "userbot")
+for _name, _client, _token in EXTRA_CLIENTS:
+    POOL.add(_name, _client, "bot" if _token else "userbot")
+
+for _lane_name, _lane in PRIORITIES.items():
+    register_gauge(
+        f"forwarder_send_waiting_{_lane_name}",
+        f"Sends waiting for rate budget in the {_lane_name} priority lane",
+        lambda lane=_lane: sum(m.waiting(lane) for m in POOL.members()),
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Time between stack samples of the loop thread while a session runs
+_SAMPLE_INTERVAL = 0.005  # seconds
+
+# Held for the duration of a session; a second /profile is refused
+_lock = threading.Lock()
+
+
+class ProfileBusy(Exception):
+    """Raised when a profiling session is already running."""
+
+
+class _CoroutineTimes:
+    """Task factory that records the wall time of every task created while installed."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._previous = loop.get_task_factory()
+        self._running: dict[asyncio.Task, tuple[str, float]] = {}
+        self.finished: dict[str, list[float]] = {}
+
+    def __call__(self, loop, coro, **kwargs):
+        if self._previous is not None:
+            task = self._previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        name = getattr(coro, "__qualname__", type(coro).__name__)
+        self._running[task] = (name, time.perf_counter())
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task) -> None:
+        entry = self._running.pop(task, None)
+        if entry:
+            name, started = entry
+            self.finished.setdefault(name, []).append(time.perf_counter() - started)
+
+    def install(self) -> None:
+        self._loop.set_task_factory(self)
+
+    def uninstall(self) -> None:
+        self._loop.set_task_factory(self._previous)
+        # Tasks still running at the end count with their time so far
+        now = time.perf_counter()
+        for name, started in self._running.values():
+            self.finished.setdefault(f"{name} (unfinished)", []).append(now - started)
+        self._running.clear()
+
+    def table(self, limit: int = 30) -> str:
+        rows = sorted(self.finished.items(), key=lambda item: sum(item[1]), reverse=True)[:limit]
+        lines = [f"{'coroutine':<60} {'count':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for name, times in rows:
+            lines.append(
+                f"{name[:60]:<60} {len(times):>7} {sum(times):>9.3f} "
+                f"{sum(times) / len(times) * 1000:>9.2f} {max(times) * 1000:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample_stacks(thread_id: int, stop: threading.Event, folded: dict[str, int]) -> None:
+    """Collect folded stacks ("outer;inner count") of `thread_id` until `stop` is set."""
+    while not stop.wait(_SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            key = ";".join(reversed(stack))
+            folded[key] = folded.get(key, 0) + 1
+
+
+async def profile_loop(seconds: float) -> tuple[str, str]:
+    """
+    Profile the running event loop for `seconds`.
+
+    Combines cProfile (CPU per function), a task factory (wall time per
+    coroutine) and a stack sampler for the loop thread. Returns
+    (text_report, folded_stacks); the latter loads into flamegraph.pl or
+    speedscope. Nothing is installed outside a session.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfileBusy()
+    try:
+        loop = asyncio.get_running_loop()
+        coroutines = _CoroutineTimes(loop)
+        folded: dict[str, int] = {}
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=_sample_stacks, args=(threading.get_ident(), stop, folded),
+            name="profile-sampler", daemon=True,
+        )
+        profiler = cProfile.Profile()
+
+        coroutines.install()
+        sampler.start()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+            stop.set()
+            coroutines.uninstall()
+            await loop.run_in_executor(None, sampler.join)
+
+        out = io.StringIO()
+        out.write(f"Event loop profile over {seconds:g}s\n\n")
+        out.write("== Coroutine wall time (tasks created during the window) ==\n")
+        out.write(coroutines.table() + "\n\n")
+        out.write("== CPU by cumulative time ==\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(40)
+        out.write("== CPU by own time ==\n")
+        stats.sort_stats("tottime").print_stats(25)
+        stacks = "\n".join(f"{stack} {count}" for stack, count in sorted(folded.items()))
+        return out.getvalue(), stacks + "\n"
+    finally:
+        _lock.release()
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+
+from telethon.tl import types
+
+from bot import CACHE, FORWARD_MODE_KEY, LOGS
+
+RECORD_VERSION = 1
+_FLUSH_INTERVAL = 1  # seconds
+
+
+class UpdateRecorder:
+    """
+    Append the routed updates both clients receive to a compact JSONL file.
+
+    Content is anonymized on the way in: chat IDs become sequential indices
+    (consistent within one recording), text is reduced to its length and
+    media to a flag. Message IDs, album grouping and timing are kept since
+    they define the traffic shape. The first line holds the task topology
+    in the same index space so a replay can recreate matching tasks.
+
+    Entry lines: [offset_ms, client, kind, chat, msg_ids, grouped_id, text_len, media, out]
+    """
+
+    __slots__ = ("path", "_file", "_chats", "_t0", "updates")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._chats: dict[int, int] = {}
+        self._t0 = 0.0
+        self.updates = 0
+
+    def _chat(self, chat_id: int) -> int:
+        index = self._chats.get(chat_id)
+        if index is None:
+            index = self._chats[chat_id] = len(self._chats)
+        return index
+
+    def _open(self) -> None:
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._t0 = time.monotonic()
+        tasks = []
+        for name, task in CACHE.items():
+            if name == FORWARD_MODE_KEY or not isinstance(task, dict):
+                continue
+            tasks.append({
+                "source": [self._chat(c) for c in task.get("source") or []],
+                "target": [self._chat(c) for c in task.get("target") or []],
+                "delay": task.get("delay", 0),
+                "has_to_forward": task.get("has_to_forward", True),
+                "has_to_edit": task.get("has_to_edit", False),
+            })
+        header = {"version": RECORD_VERSION, "started": int(time.time()), "tasks": tasks}
+        self._file.write(json.dumps(header, separators=(",", ":")) + "\n")
+        LOGS.info("Recording updates to %s", self.path)
+
+    def record(self, name: str, update, chat_id: int, out: bool = False) -> None:
+        """Append one routed update received by client `name`."""
+        try:
+            if self._file is None:
+                self._open()
+            offset = round((time.monotonic() - self._t0) * 1000, 1)
+            if isinstance(update, types.UpdateDeleteChannelMessages):
+                entry = [offset, name, "delete", self._chat(chat_id), update.messages, None, 0, False, False]
+            else:
+                message = getattr(update, "message", None)
+                is_edit = isinstance(update, (types.UpdateEditMessage, types.UpdateEditChannelMessage))
+                kind = "edit" if is_edit else "new"
+                if isinstance(message, types.Message):
+                    entry = [
+                        offset, name, kind, self._chat(chat_id), [message.id], message.grouped_id,
+                        len(message.message or ""), message.media is not None, out,
+                    ]
+                else:  # UpdateShortMessage / UpdateShortChatMessage
+                    entry = [
+                        offset, name, kind, self._chat(chat_id), [update.id], None,
+                        len(update.message or ""), False, out,
+                    ]
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.updates += 1
+        except Exception as exc:
+            LOGS.warning("Failed to record update: %s", exc)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+
+def read_recording(path: str) -> tuple[dict, list]:
+    """Return (header, entries) of a recording made by UpdateRecorder."""
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != RECORD_VERSION:
+            raise ValueError(f"Unsupported recording version: {header.get('version')}")
+        entries = [json.loads(line) for line in f if line.strip()]
+    return header, entries
+
+
+async def recorder_flush_loop(recorder: UpdateRecorder) -> None:
+    """Push buffered entries to disk periodically; writes themselves never block on I/O."""
+    while True:
+        await asyncio.sleep(_FLUSH_INTERVAL)
+        recorder.flush()
@@ -0,0 +1,283 @@
+import asyncio
+import time
+from collections import deque
+
+from bot import CACHE, SOURCE_INDEX
+from .pool import PRIORITIES
+
+# Own copies in chats that other tasks read are remembered this long
+_OWN_SEND_TTL = 120  # seconds
+# Longest an update waits for in-flight sends into its chat to report their IDs
+_OWN_SEND_WAIT = 10  # seconds
+
+
+class RoutingCycleError(ValueError):
+    """Raised when a task change would make messages loop between chats."""
+
+    def __init__(self, cycle: list[int]):
+        self.cycle = cycle
+        super().__init__("forwarding loop " + " → ".join(str(chat) for chat in cycle))
+
+
+def _active_tasks(overrides: dict[str, dict | None]):
+    for name, task in CACHE.items():
+        if name in overrides or name.startswith("__") or not isinstance(task, dict):
+            continue
+        yield task
+    for task in overrides.values():
+        if task is not None:
+            yield task
+
+
+def find_cycle(overrides: dict[str, dict | None] | None = None) -> list[int] | None:
+    """
+    Return a chat loop in the routing graph of active tasks, or None.
+
+    Edges run from every source to every target of a running task.
+    `overrides` replaces tasks by name (None removes one) to check a change
+    before it is applied; only loops through the changed tasks' own routes
+    are reported then, so a loop already in the stored tasks does not block
+    unrelated changes. Without overrides the whole graph is searched.
+    """
+    graph: dict[int, set[int]] = {}
+    for task in _active_tasks(overrides or {}):
+        if not task.get("has_to_forward"):
+            continue
+        targets = task.get("target") or []
+        for src in task.get("source") or []:
+            graph.setdefault(src, set()).update(targets)
+
+    if overrides:
+        changed = [task for task in overrides.values() if task is not None and task.get("has_to_forward")]
+        return _cycle_through(graph, changed)
+
+    done: set[int] = set()
+    for root in graph:
+        if root in done:
+            continue
+        # Iterative DFS; `path` holds the chats on the current branch
+        path, on_path = [root], {root}
+        stack = [iter(graph.get(root, ()))]
+        while stack:
+            nxt = next(stack[-1], None)
+            if nxt is None:
+                stack.pop()
+                done.add(path[-1])
+                on_path.discard(path.pop())
+                continue
+            if nxt in on_path:
+                return path[path.index(nxt):] + [nxt]
+            if nxt in done:
+                continue
+            path.append(nxt)
+            on_path.add(nxt)
+            stack.append(iter(graph.get(nxt, ())))
+    return None
+
+
+def _cycle_through(graph: dict[int, set[int]], tasks: list[dict]) -> list[int] | None:
+    """A loop using some source → target edge of `tasks`: a path from the target back to the source."""
+    for task in tasks:
+        sources = set(task.get("source") or [])
+        for start in task.get("target") or []:
+            parent: dict[int, int | None] = {start: None}
+            queue = deque([start])
+            while queue:
+                chat = queue.popleft()
+                if chat in sources:
+                    path = [chat]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    return [chat] + path[::-1]
+                for nxt in graph.get(chat, ()):
+                    if nxt not in parent:
+                        parent[nxt] = chat
+                        queue.append(nxt)
+    return None
+
+
+def check_routes(overrides: dict[str, dict | None]) -> None:
+    """Raise RoutingCycleError if applying `overrides` would create a forwarding loop."""
+    cycle = find_cycle(overrides)
+    if cycle:
+        raise RoutingCycleError(cycle)
+
+
+# Source chat -> names of every task a message there reaches, directly or through chains
+_FLAT: dict[int, tuple[str, ...]] = {}
+
+
+class Route:
+    """
+    Running tasks of one source that deliver with identical options, merged.
+
+    `targets` maps every distinct target chat to the tasks owning it, so a
+    message costs one send per target however many tasks share it, and the
+    result is credited to each owner. Each target is sent in the lane of
+    its most urgent owner (`lanes`), so an urgent task sharing a source
+    with bulk tasks does not lift their targets into its lane.
+    """
+
+    __slots__ = (
+        "tasks", "targets", "lanes", "delay", "blacklist", "show_header", "copy_template", "preserve_replies", "dedup",
+    )
+
+    def __init__(self, options: tuple):
+        self.delay, self.blacklist, self.show_header, self.copy_template, self.preserve_replies, self.dedup = options
+        self.tasks: list[str] = []
+        self.targets: dict[int, list[str]] = {}
+        self.lanes: dict[int, int] = {}
+
+    def add(self, task: dict) -> None:
+        self.tasks.append(task["work_name"])
+        lane = task_lane(task)
+        for chat in task.get("target") or []:
+            self.targets.setdefault(chat, []).append(task["work_name"])
+            self.lanes[chat] = min(self.lanes.get(chat, lane), lane)
+
+    def without(self, names: set) -> "Route | None":
+        """This route minus the tasks in `names` (None if nothing is left)."""
+        if not names.intersection(self.tasks):
+            return self
+        rest = Route(
+            (self.delay, self.blacklist, self.show_header, self.copy_template, self.preserve_replies, self.dedup)
+        )
+        for name in self.tasks:
+            if name not in names:
+                rest.add(CACHE[name])
+        return rest if rest.tasks else None
+
+    @property
+    def label(self) -> str:
+        return ",".join(self.tasks)
+
+
+def task_lane(task: dict) -> int:
+    """Send lane of a task's priority setting."""
+    return PRIORITIES.get(task.get("priority"), PRIORITIES["normal"])
+
+
+def _delivery_options(task: dict) -> tuple:
+    """Settings that decide what a target receives; tasks with equal options share a Route."""
+    blacklist = tuple(sorted(task.get("blacklist_words") or ())) if task.get("has_to_blacklist") else ()
+    copy_template = task.get("copy_caption", "") if task.get("copy_mode") else None
+    return (
+        task.get("delay") or 0,
+        blacklist,
+        bool(task.get("show_forward_header")),
+        copy_template,
+        bool(task.get("preserve_replies")),
+        bool(task.get("dedup_content")),
+    )
+
+
+# Source chat -> merged routes of its running tasks
+_ROUTES: dict[int, tuple[Route, ...]] = {}
+
+
+def source_routes(chat_id: int) -> tuple[Route, ...]:
+    """Merged routes for new messages in `chat_id`, built once per task change."""
+    routes = _ROUTES.get(chat_id)
+    if routes is None:
+        by_options: dict[tuple, Route] = {}
+        for name in sorted(SOURCE_INDEX.get(chat_id, ())):
+            task = CACHE.get(name)
+            if not task or not task.get("has_to_forward"):
+                continue
+            options = _delivery_options(task)
+            route = by_options.get(options)
+            if route is None:
+                route = by_options[options] = Route(options)
+            route.add(task)
+        routes = _ROUTES[chat_id] = tuple(by_options.values())
+    return routes
+
+
+def invalidate_routes() -> None:
+    """Forget the flattened and merged routes; called whenever a task changes."""
+    _FLAT.clear()
+    _ROUTES.clear()
+
+
+def routed_tasks(chat_id: int) -> list[dict]:
+    """
+    Tasks a message in `chat_id` reaches: its own tasks plus, transitively,
+    the tasks reading the targets of running ones.
+
+    Chained tasks are delivered straight from the origin message, so edits
+    and deletes there have to reach them too. Computed once per chat.
+    """
+    names = _FLAT.get(chat_id)
+    if names is None:
+        seen, queue = {}, [chat_id]
+        while queue:
+            chat = queue.pop()
+            for name in SOURCE_INDEX.get(chat, ()):
+                task = CACHE.get(name)
+                if name in seen or not task:
+                    continue
+                seen[name] = None
+                if task.get("has_to_forward"):
+                    queue.extend(task.get("target") or [])
+        names = _FLAT[chat_id] = tuple(seen)
+    return [CACHE[name] for name in names if name in CACHE]
+
+
+class OwnSends:
+    """
+    Copies this bot posted into chats that other tasks read.
+
+    Chained tasks get a message from the origin event, so when the copy
+    shows up in the intermediate chat it must not be forwarded again. A
+    copy can arrive from another account before the send returns its ID;
+    such updates wait for the chat's in-flight sends to finish.
+    """
+
+    __slots__ = ("_pending", "_sent", "_waiters")
+
+    def __init__(self):
+        self._pending: dict[int, int] = {}
+        self._sent: dict[tuple[int, int], float] = {}
+        self._waiters: dict[int, asyncio.Event] = {}
+
+    def __bool__(self) -> bool:
+        # Cheap test on every update: nothing to check unless chained chats were sent to
+        return bool(self._pending or self._sent)
+
+    def begin(self, chat: int) -> None:
+        self._pending[chat] = self._pending.get(chat, 0) + 1
+
+    def end(self, chat: int, msg_id: int | None) -> None:
+        now = time.time()
+        if msg_id:
+            self._sent[(chat, msg_id)] = now
+        left = self._pending.get(chat, 1) - 1
+        if left:
+            self._pending[chat] = left
+        else:
+            self._pending.pop(chat, None)
+        waiter = self._waiters.pop(chat, None)
+        if waiter:
+            waiter.set()
+        expired = [k for k, ts in self._sent.items() if now - ts > _OWN_SEND_TTL]
+        for k in expired:
+            del self._sent[k]
+
+    async def is_own(self, chat: int, msg_id: int) -> bool:
+        key = (chat, msg_id)
+        deadline = time.monotonic() + _OWN_SEND_WAIT
+        while key not in self._sent and self._pending.get(chat):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            waiter = self._waiters.setdefault(chat, asyncio.Event())
+            try:
+                await asyncio.wait_for(waiter.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self._sent.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self._pending.clear()
+        self._sent.clear()
+        self._waiters.clear()
@@ -0,0 +1,88 @@
+import json
+import logging
+import random
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from bot import Var
+
+# Completed traces kept in memory for /traces
+_RECENT = deque(maxlen=500)
+
+_writer = logging.getLogger("bot.traces")
+_writer.propagate = False
+if Var.TRACE_SAMPLE_RATE > 0:
+    _handler = RotatingFileHandler(Var.TRACE_FILE, maxBytes=5 * 1024 * 1024, backupCount=3)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _writer.addHandler(_handler)
+    _writer.setLevel(logging.INFO)
+
+
+class Trace:
+    """
+    Stage timestamps for one message on its way through one task.
+
+    Offsets are milliseconds since the update reached the forwarder.
+    Per-target stages carry the target chat so fan-out sends can be told apart.
+    """
+
+    __slots__ = ("task", "chat", "msg_id", "wall", "_t0", "stages")
+
+    def __init__(self, chat: int, msg_id: int, t0: float, task: str | None = None):
+        self.task = task
+        self.chat = chat
+        self.msg_id = msg_id
+        self.wall = time.time()
+        self._t0 = t0
+        self.stages: list[tuple[str, float, int | None]] = []
+
+    def mark(self, stage: str, target: int | None = None) -> None:
+        self.stages.append((stage, round((time.monotonic() - self._t0) * 1000, 2), target))
+
+    def fork(self, task: str) -> "Trace":
+        """Copy of the shared (pre-task) stages for one task's fan-out."""
+        child = Trace(self.chat, self.msg_id, self._t0, task)
+        child.wall = self.wall
+        child.stages = list(self.stages)
+        return child
+
+    @property
+    def total_ms(self) -> float:
+        return self.stages[-1][1] if self.stages else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "ts": round(self.wall, 3),
+            "task": self.task,
+            "chat": self.chat,
+            "msg": self.msg_id,
+            "total_ms": self.total_ms,
+            "stages": [
+                {"stage": s, "ms": ms, "target": t} if t is not None else {"stage": s, "ms": ms}
+                for s, ms, t in self.stages
+            ],
+        }
+
+    def finish(self) -> None:
+        self.mark("done")
+        _RECENT.append(self)
+        try:
+            _writer.info(json.dumps(self.as_dict(), separators=(",", ":")))
+        except Exception:
+            pass
+
+
+def start_trace(chat: int, msg_id: int, t0: float) -> Trace | None:
+    """Return a new Trace for a sampled message, None for the rest."""
+    rate = Var.TRACE_SAMPLE_RATE
+    if rate <= 0 or (rate < 1 and random.random() >= rate):
+        return None
+    trace = Trace(chat, msg_id, t0)
+    trace.mark("received")
+    return trace
+
+
+def slowest_traces(limit: int = 5) -> list[Trace]:
+    """Slowest completed traces among the recent ones."""
+    return sorted(_RECENT, key=lambda t: t.total_ms, reverse=True)[:limit]
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from bot import LOGS, Var
+from .metrics import register_gauge
+
+# How often the loop heartbeat runs
+_BEAT_INTERVAL = 0.1  # seconds
+# Frames of the blocking stack written to the log
+_STACK_DEPTH = 12
+_BOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LoopWatchdog:
+    """
+    Measure event-loop lag and catch the code that blocks the loop.
+
+    A heartbeat coroutine notes how late each of its wake-ups is (the lag
+    every other callback sees too). A monitor thread checks the last beat;
+    once the loop has been stuck longer than the threshold it captures the
+    loop thread's stack while the blocking call is still running, and logs
+    it with the innermost frame in bot code as the origin.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.lag = 0.0
+        self.peak = 0.0
+        self.stalls: deque = deque(maxlen=20)  # (ts, seconds, origin)
+        self._last_beat = time.monotonic()
+        self._loop_thread = None
+        self._captured = None  # (beat, stack) of the current stall
+
+    def start(self) -> None:
+        """Start the heartbeat on the running loop and the monitor thread."""
+        if self._loop_thread is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        asyncio.ensure_future(self._heartbeat())
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + _BEAT_INTERVAL
+            await asyncio.sleep(_BEAT_INTERVAL)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.lag = lag
+            self.peak = max(self.peak, lag)
+            self._last_beat = now
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _monitor(self) -> None:
+        interval = max(self.threshold / 2, 0.01)
+        while True:
+            time.sleep(interval)
+            beat = self._last_beat
+            if time.monotonic() - beat - _BEAT_INTERVAL < self.threshold:
+                continue
+            if self._captured and self._captured[0] == beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = (beat, traceback.extract_stack(frame))
+
+    def _report(self, lag: float) -> None:
+        stack = None
+        if self._captured:
+            stack = self._captured[1]
+            self._captured = None
+        origin = "unknown (stall ended before it was sampled)"
+        if stack:
+            own = [f for f in stack if f.filename.startswith(_BOT_DIR)]
+            innermost = (own or stack)[-1]
+            path = os.path.relpath(innermost.filename, os.path.dirname(_BOT_DIR))
+            origin = f"{path}:{innermost.lineno} in {innermost.name}"
+        self.stalls.append((time.time(), lag, origin))
+        if stack:
+            LOGS.warning(
+                "Event loop blocked for %.0f ms at %s\n%s",
+                lag * 1000, origin, "".join(traceback.format_list(stack[-_STACK_DEPTH:])).rstrip(),
+            )
+        else:
+            LOGS.warning("Event loop blocked for %.0f ms (%s)", lag * 1000, origin)
+
+
+WATCHDOG = LoopWatchdog(Var.LOOP_LAG_THRESHOLD_MS / 1000)
+register_gauge("forwarder_loop_lag_seconds", "Lateness of the last event loop heartbeat", lambda: WATCHDOG.lag)
+register_gauge("forwarder_loop_lag_peak_seconds", "Highest event loop lag since start", lambda: WATCHDOG.peak)
@@ -0,0 +1,194 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+
+from telethon.crypto import AuthKey
+from telethon.sessions import MemorySession, StringSession
+from telethon.tl.types.updates import State
+
+LOGS = logging.getLogger(__name__)
+
+SESSION_KEY_PREFIX = "__SESSION__:"
+# Changes are batched and written at most this often
+_FLUSH_DELAY = 2  # seconds
+
+
+class RedisSession(MemorySession):
+    """
+    Telethon session persisted in Redis: auth key, DC, entity cache and update state.
+
+    Telethon's session API is synchronous, so changes are collected in
+    memory and written in a single pipeline shortly after, and on `flush()`.
+    `seed` (the bot token or session string) is fingerprinted so a changed
+    credential discards the stored session instead of reusing the wrong one.
+    """
+
+    def __init__(self, redis, name: str, seed: str, string: str | None = None):
+        super().__init__()
+        self._redis = redis
+        self._key = f"{SESSION_KEY_PREFIX}{name}"
+        self._seed = hashlib.sha256(seed.encode()).hexdigest()[:16]
+        self._by_id: dict[int, tuple] = {}
+        self._dirty_meta = False
+        self._dirty_entities: dict[int, tuple] = {}
+        self._dirty_states: dict[int, State] = {}
+        self._flush_handle = None
+        if string:
+            # Start from the StringSession auth; replaced by Redis data in load()
+            seeded = StringSession(string)
+            self._dc_id = seeded.dc_id
+            self._server_address = seeded.server_address
+            self._port = seeded.port
+            self._auth_key = seeded.auth_key
+            self._dirty_meta = True
+
+    async def load(self) -> bool:
+        """Restore the session from Redis. Returns True if a stored auth key was loaded."""
+        try:
+            meta = await self._redis.hgetall(self._key)
+            if not meta or meta.get("seed") != self._seed:
+                self._dirty_meta = True
+                return False
+            entities = await self._redis.hgetall(f"{self._key}:entities")
+            states = await self._redis.hgetall(f"{self._key}:states")
+        except Exception as e:
+            LOGS.warning("Failed to load session %s from Redis: %s", self._key, e)
+            return False
+
+        self._dc_id = int(meta["dc_id"])
+        self._server_address = meta["server_address"]
+        self._port = int(meta["port"])
+        self._auth_key = AuthKey(bytes.fromhex(meta["auth_key"])) if meta.get("auth_key") else None
+        for entity_id, raw in entities.items():
+            row = (int(entity_id), *json.loads(raw))
+            self._by_id[row[0]] = row
+        self._entities = set(self._by_id.values())
+        for entity_id, raw in states.items():
+            pts, qts, date, seq, unread = json.loads(raw)
+            self._update_states[int(entity_id)] = State(
+                pts, qts, datetime.datetime.fromtimestamp(date, datetime.timezone.utc), seq, unread
+            )
+        self._dirty_meta = False
+        LOGS.info(
+            "Restored session %s (%d entities, %d update states)",
+            self._key, len(self._by_id), len(self._update_states),
+        )
+        return self._auth_key is not None
+
+    # --- Tracked setters ---
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self._dirty_meta = True
+        self._schedule_flush()
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        old = self._auth_key.key if self._auth_key else None
+        self._auth_key = value
+        if (value.key if value else None) != old:
+            self._dirty_meta = True
+            self._schedule_flush()
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self._dirty_states[entity_id] = state
+        self._schedule_flush()
+
+    def process_entities(self, tlo):
+        changed = False
+        for row in self._entities_to_rows(tlo):
+            old = self._by_id.get(row[0])
+            if old != row:
+                # Drop the stale row so username/phone/name scans cannot match it
+                self._entities.discard(old)
+                self._by_id[row[0]] = row
+                self._entities.add(row)
+                self._dirty_entities[row[0]] = row
+                changed = True
+        if changed:
+            self._schedule_flush()
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        # O(1) lookup instead of MemorySession's scan over every entity
+        if exact:
+            row = self._by_id.get(id)
+            return (row[0], row[1]) if row else None
+        return super().get_entity_rows_by_id(id, exact)
+
+    def save(self):
+        self._schedule_flush()
+
+    def delete(self):
+        super().delete()
+        self._by_id.clear()
+        self._dirty_entities.clear()
+        self._dirty_states.clear()
+        asyncio.ensure_future(self._redis.delete(
+            self._key, f"{self._key}:entities", f"{self._key}:states"
+        ))
+
+    # --- Persistence ---
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            loop = asyncio.get_event_loop()
+            self._flush_handle = loop.call_later(
+                _FLUSH_DELAY, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self) -> None:
+        """Write all pending changes to Redis in one pipeline."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not (self._dirty_meta or self._dirty_entities or self._dirty_states):
+            return
+
+        entities, self._dirty_entities = self._dirty_entities, {}
+        states, self._dirty_states = self._dirty_states, {}
+        write_meta, self._dirty_meta = self._dirty_meta, False
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            if write_meta and self._server_address:
+                pipe.hset(self._key, mapping={
+                    "seed": self._seed,
+                    "dc_id": self._dc_id,
+                    "server_address": self._server_address,
+                    "port": self._port,
+                    "auth_key": self._auth_key.key.hex() if self._auth_key else "",
+                })
+            if entities:
+                pipe.hset(f"{self._key}:entities", mapping={
+                    str(entity_id): json.dumps(row[1:]) for entity_id, row in entities.items()
+                })
+            if states:
+                pipe.hset(f"{self._key}:states", mapping={
+                    str(entity_id): json.dumps([
+                        s.pts, s.qts, int(s.date.timestamp()) if s.date else 0, s.seq, s.unread_count,
+                    ])
+                    for entity_id, s in states.items()
+                })
+            await pipe.execute()
+        except Exception as e:
+            LOGS.warning("Failed to persist session %s: %s", self._key, e)
+            # Keep the changes for the next attempt
+            self._dirty_meta |= write_meta
+            self._dirty_entities = {**entities, **self._dirty_entities}
+            self._dirty_states = {**states, **self._dirty_states}
+            self._schedule_flush()
+
+
+async def autosave_sessions(clients, interval: int = 30) -> None:
+    """Periodically snapshot each client's update state (pts) so a crash loses little."""
+    while True:
+        await asyncio.sleep(interval)
+        for client in clients:
+            try:
+                if client.is_connected():
+                    await client._save_states_and_entities()
+                await client.session.flush()
+            except Exception as e:
+                LOGS.warning("Session autosave failed: %s", e)
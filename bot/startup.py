@@ -0,0 +1,35 @@
+import time
+
+
+class StartupTimer:
+    """Collect per-stage wall times of the startup pipeline for a final report."""
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = seconds
+
+    async def run(self, name: str, coro):
+        """Await `coro`, recording how long it took under `name`."""
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.stages[name] = time.perf_counter() - started
+
+    def measure(self, name: str, func, *args):
+        """Call a blocking `func`, recording how long it took under `name`."""
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.stages[name] = time.perf_counter() - started
+
+    def report(self) -> str:
+        total = time.perf_counter() - self._started
+        width = max((len(name) for name in self.stages), default=0)
+        lines = [f"  {name:<{width}}  {seconds:6.2f}s" for name, seconds in self.stages.items()]
+        lines.append(f"  {'total (wall)':<{width}}  {total:6.2f}s")
+        return "Startup timing (concurrent stages overlap):\n" + "\n".join(lines)